@@ -1,26 +1,56 @@
 import math
+from collections import deque
 
 import numpy as np
 
-from buildings import SendingFacility, Airport
+from buildings import SendingFacility, Airport, closure_interval
+from randomStreams import RandomStream
 from simulationManager import *
 
+# a drone that ends a step closer than this to its target in m has arrived. Legs can be a whole number of steps long,
+# e.g. back from where a drone was held on its last step to the destination, and then the last step lands on the
+# target give or take rounding
+ARRIVAL_TOLERANCE = 1e-6
+
 
 class Drone:
+    __slots__ = ("simulationManager", "x", "y", "target", "job", "taskCompleteTime", "currentStatus", "base", "employee",
+                 "airspace", "legClosures", "legPosition", "frozen", "frozenTime", "lastFlightTime", "nextFlightTime",
+                 "maxSpeed", "eventOrder")
 
-    def __init__(self, simulation_manager: SimulationManager, max_speed, airport_traffic):
+    def __init__(self, simulation_manager: SimulationManager, max_speed, airspace):
+        self.simulationManager = simulation_manager
         self.x = 0
         self.y = 0
         self.target = None
         self.job = None
         self.taskCompleteTime = -1.0
+        self.currentStatus = None
         self.status = "idling"
         self.base = None  # which delivery center this drone belongs to
         self.employee = None  # the employee loading on this drone
-        self.airportTraffic = airport_traffic
+        self.airspace = airspace  # runways whose traffic can close the airspace, see airspace.py
+        self.legClosures = None  # closure intervals along the current leg, see Airspace.leg_closures()
+        self.legPosition = 0.0  # distance flown along the current leg in m
+        self.frozen = False  # if the drone was held outside a closure on its last flight step
+        self.frozenTime = 0.0  # total time the drone was held outside closures in s
+        self.lastFlightTime = None  # last tick the drone was flown, if the ticks until its next update are skipped
+        self.nextFlightTime = 0.0  # tick the drone has to be flown next while flying, see next_flight_time()
 
-        self.simulationManager = simulation_manager
         self.maxSpeed = max_speed  # max speed of the drones in m/s
+        self.eventOrder = simulation_manager.next_agent_order()
+
+    # every status change is counted by the simulation manager
+    @property
+    def status(self):
+        return self.currentStatus
+
+    @status.setter
+    def status(self, value):
+        self.simulationManager.change_drone_status(self.currentStatus, value)
+        self.currentStatus = value
+        if self.simulationManager.deliveryLog is not None:
+            self.simulationManager.deliveryLog.status_changed(self, value)
 
     def set_base(self, base: SendingFacility):
         self.base = base
@@ -36,6 +66,8 @@ class Drone:
         self.status = "loading"
         self.employee = employee
         self.employee.isFree = False
+        if self.simulationManager.eventDriven:
+            self.schedule_update(self.simulationManager.tick_after(self.taskCompleteTime))
 
     def flight(self):
         # calculate new position after traveling
@@ -43,9 +75,19 @@ class Drone:
         dy = self.target.y - self.y
         dist = math.sqrt(dx**2 + dy**2)
         travel_dist = self.maxSpeed * self.simulationManager.timeStep
-        ratio = travel_dist / dist
-        new_x = self.x + dx * ratio
-        new_y = self.y + dy * ratio
+
+        # if new position reaches or overshoots the destination, snap the drone to it. This is tested first, so a leg
+        # of zero length, e.g. to a destination at the facility, is never divided by
+        arriving = dist <= travel_dist + ARRIVAL_TOLERANCE
+        if arriving:
+            new_x = self.target.x
+            new_y = self.target.y
+            step_dist = dist
+        else:
+            ratio = travel_dist / dist
+            new_x = self.x + dx * ratio
+            new_y = self.y + dy * ratio
+            step_dist = travel_dist
 
         # handling airspace closure due to landing and departing airport traffic
         # for landing traffic, 5 mile final to approach end of runway is closed if there are planes within
@@ -54,28 +96,53 @@ class Drone:
         # if there are planes departing. The closure area is 2 miles wide
         freeze = False
 
-        if self.airportTraffic.departingTraffic > 0:
-            closure = self.airportTraffic.airport.departure_end_closure()
-            inside_closure_now = self.inside_rectangle(closure[0][0], closure[0][1], closure[1][0], closure[1][1], closure[2][0], closure[2][1], self.x, self.y)
-            inside_closure_next = self.inside_rectangle(closure[0][0], closure[0][1], closure[1][0], closure[1][1], closure[2][0], closure[2][1], new_x, new_y)
-            if not inside_closure_now and inside_closure_next:
-                freeze = True
-
-        if self.airportTraffic.landingTraffic > 0:
-            closure = self.airportTraffic.airport.approach_end_closure()
-            inside_closure_now = self.inside_rectangle(closure[0][0], closure[0][1], closure[1][0], closure[1][1], closure[2][0], closure[2][1], self.x, self.y)
-            inside_closure_next = self.inside_rectangle(closure[0][0], closure[0][1], closure[1][0], closure[1][1], closure[2][0], closure[2][1], new_x, new_y)
-            if not inside_closure_now and inside_closure_next:
-                freeze = True
-
-        # if new position ends up in an overshoot, snap the drone to destination
-        if (self.target.x - new_x) * dx < 0:
-            new_x = self.target.x
-            new_y = self.target.y
+        # only the runways with closures near the drone are checked
+        if self.legClosures is not None:
+            next_leg_position = self.legPosition + step_dist
+            for runway, intervals in self.legClosures:
+                airportTraffic = self.airspace.airportTraffic[runway]
+                departure_interval, approach_interval = intervals[airportTraffic.airport.opsDirection - 1]
+                if airportTraffic.departingTraffic > 0 and self.entering_closure(departure_interval, next_leg_position):
+                    freeze = True
+                if airportTraffic.landingTraffic > 0 and self.entering_closure(approach_interval, next_leg_position):
+                    freeze = True
+        else:
+            for runway in self.airspace.runways_near(self.x, self.y, new_x, new_y):
+                airportTraffic = self.airspace.airportTraffic[runway]
+                if airportTraffic.departingTraffic > 0:
+                    edges = airportTraffic.airport.departure_end_edges()
+                    if not self.inside_rectangle(edges, self.x, self.y) and self.inside_rectangle(edges, new_x, new_y):
+                        freeze = True
+
+                if airportTraffic.landingTraffic > 0:
+                    edges = airportTraffic.airport.approach_end_edges()
+                    if not self.inside_rectangle(edges, self.x, self.y) and self.inside_rectangle(edges, new_x, new_y):
+                        freeze = True
+
+        if arriving:
             self.unloading() if self.status == "delivering" else self.job_complete()
 
         if not freeze:
             self.update_position(new_x, new_y)
+            self.legPosition += travel_dist
+        else:
+            self.frozenTime += self.simulationManager.timeStep
+        self.frozen = freeze
+
+    # a new straight leg starts from the current position toward the target
+    def start_leg(self):
+        self.legPosition = 0.0
+        self.lastFlightTime = None
+        if self.simulationManager.closureIntervals:
+            self.legClosures = self.airspace.leg_closures(self.x, self.y, self.target.x, self.target.y)
+        else:
+            self.legClosures = None
+
+    # if the drone would go from outside to inside the closure interval along its leg
+    def entering_closure(self, interval, next_leg_position):
+        if interval is None:
+            return False
+        return not interval[0] <= self.legPosition <= interval[1] and interval[0] <= next_leg_position <= interval[1]
 
     def unloading(self):
         self.status = "unloading"
@@ -87,48 +154,145 @@ class Drone:
         self.target = None
         self.base.job_complete(self)
 
+    # the task is wrapped up before the first flight of the new leg, which can already reach the target and start the
+    # next task
     def update(self):
         if self.status == "loading":
             if self.simulationManager.currentTime > self.taskCompleteTime:
                 self.status = "delivering"
-                self.flight()
                 self.taskCompleteTime = -1.0
-                self.employee.isFree = True
+                self.base.release_employee(self.employee)
                 self.employee = None
+                self.start_leg()
+                self.flight()
         elif self.status == "delivering" or self.status == "returning":
+            if self.simulationManager.currentTime < self.nextFlightTime:
+                # not due yet. Under the event driven clock the drone is woken again when it is
+                if self.simulationManager.eventDriven:
+                    self.schedule_update(self.nextFlightTime)
+                return
+            self.skip_steps()
             self.flight()
         elif self.status == "unloading":
             if self.simulationManager.currentTime > self.taskCompleteTime:
                 self.status = "returning"
-                self.flight()
                 self.taskCompleteTime = -1.0
-                self.job.hasActiveRequest = False
+                self.job.request_complete()
+                self.start_leg()
+                self.flight()
 
-    def inside_rectangle(self, ax, ay, bx, by, cx, cy, px, py):
-        w = (bx - ax) * (px - ax) + (by - ay) * (py - ay)
-        x = (bx - ax)**2 + (by - ay)**2
-        y = (cx - bx) * (px - bx) + (cy - by) * (py - by)
-        z = (cx - bx)**2 + (cy - by)**2
+        # a flying drone picks its own step, see next_flight_time(). Under the event driven clock, the drone only
+        # needs to be updated when it has to be flown or when loading or unloading is done. Completion of loading is
+        # scheduled when the loading starts, and again if the drone was woken before it is done
+        if self.status == "delivering" or self.status == "returning":
+            self.nextFlightTime = self.next_flight_time()
+            if self.simulationManager.eventDriven:
+                self.schedule_update(self.nextFlightTime)
+        elif self.simulationManager.eventDriven and (self.status == "unloading" or self.status == "loading"):
+            self.schedule_update(self.simulationManager.tick_after(self.taskCompleteTime))
+
+    def schedule_update(self, time):
+        self.simulationManager.schedule(time, SimulationManager.DRONE, self.eventOrder, self.update)
+
+    # tick the drone has to be flown next, which sets the step of a flying drone by how far it is from the closures
+    # ahead of it and from its target. Until it gets close to entering a closure or to its target, every tick only
+    # moves the drone the same distance along its leg, whether the closures are active or not. Those ticks are skipped
+    # and caught up when the drone is flown next by skip_steps(), which gives the same trajectory as flying every
+    # tick. The tick before the entry or arrival is flown normally as well, so rounding cannot make the drone skip
+    # past it. Frozen drones are flown every tick
+    def next_flight_time(self):
+        sim = self.simulationManager
+        if not sim.analyticLegs or self.frozen:
+            return sim.tick_after(sim.currentTime)
+
+        travel_dist = self.maxSpeed * sim.timeStep
+        dist = math.sqrt((self.target.x - self.x)**2 + (self.target.y - self.y)**2)
+        steps = math.floor(dist / travel_dist) - 1
+        for entry in self.closure_entries():
+            steps = min(steps, math.ceil(entry / travel_dist) - 2)
+
+        self.lastFlightTime = sim.currentTime
+        return sim.ticks_after(sim.currentTime, max(steps, 0) + 1)
+
+    # distances along the leg from the drone to where it would enter each of the closures ahead of it, active or not
+    def closure_entries(self):
+        if self.legClosures is not None:
+            return [interval[0] - self.legPosition for runway, intervals in self.legClosures for closures in intervals
+                    for interval in closures if interval is not None and self.legPosition < interval[0]]
+
+        # without closure intervals, the closures of the runways near the rest of the leg are intersected with it
+        entries = []
+        for runway in self.airspace.runways_near(self.x, self.y, self.target.x, self.target.y):
+            airport = self.airspace.airportTraffic[runway].airport
+            for ops_direction in (1, 2):
+                for edges in (airport.departure_end_edges(ops_direction), airport.approach_end_edges(ops_direction)):
+                    interval = closure_interval(edges, self.x, self.y, self.target.x, self.target.y)
+                    if interval is not None and interval[0] > 0:
+                        entries.append(interval[0])
+        return entries
+
+    # move the drone over the ticks skipped since it was last flown, see next_flight_time()
+    def skip_steps(self):
+        if self.lastFlightTime is None:
+            return
+        sim = self.simulationManager
+        steps = round((sim.currentTime - self.lastFlightTime) / sim.timeStep) - 1
+        self.update_position(*self.position(sim.currentTime - sim.timeStep))
+        self.legPosition += steps * self.maxSpeed * sim.timeStep
+        self.lastFlightTime = None
+
+    # position of the drone after the drone updates of the tick at time, the current tick by default. Drones whose
+    # ticks are being skipped are only moved when they are updated, so this is where they should be looked up. Only
+    # valid up to the next update of the drone
+    def position(self, time=None):
+        if self.lastFlightTime is None:
+            return self.x, self.y
+        if time is None:
+            time = self.simulationManager.currentTime
+        steps = round((time - self.lastFlightTime) / self.simulationManager.timeStep)
+        if steps <= 0:
+            return self.x, self.y
+        dx = self.target.x - self.x
+        dy = self.target.y - self.y
+        ratio = steps * self.maxSpeed * self.simulationManager.timeStep / math.sqrt(dx**2 + dy**2)
+        return self.x + dx * ratio, self.y + dy * ratio
+
+    # edges are the precomputed edge vectors and squared lengths of the closure rectangle, see closure_edges() in buildings.py
+    def inside_rectangle(self, edges, px, py):
+        ax, ay, abx, aby, ab_length_sq, bx, by, bcx, bcy, bc_length_sq = edges
+        w = abx * (px - ax) + aby * (py - ay)
+        y = bcx * (px - bx) + bcy * (py - by)
 
-        return 0 <= w <= x and 0 <= y <= z
+        return 0 <= w <= ab_length_sq and 0 <= y <= bc_length_sq
 
 
 class AirportTraffic:
 
-    def __init__(self, density, seed, simulation_manager: SimulationManager, airport: Airport):
+    def __init__(self, density, seed, simulation_manager: SimulationManager, airport: Airport, capacity=16):
         self.trafficDensity = density  # one takeoff or landing per this many seconds
-        self.rng = np.random.RandomState(seed)
+        self.rng = RandomStream(seed)
         self.nextTrafficInjection = 0
         self.simulationManager = simulation_manager
         self.airport = airport
-        self.relevantTraffic = []
         self.departingTraffic = 0
         self.landingTraffic = 0
-        self.departingTrafficSpawnTime = -1
-        self.invisibleTraffic = []  # used for traffic on takeoff roll. They are relevant, but should not be visible
+        self.departingTrafficSpawnTimes = deque()  # when traffic on takeoff roll appears at the departure end. They are relevant, but should not be visible
+        self.eventOrder = simulation_manager.next_agent_order()
+
+        # relevant traffic, the first numTraffic entries of each array are in use
+        self.numTraffic = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.targetX = np.zeros(capacity)
+        self.targetY = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.altitude = np.zeros(capacity)
+        self.verticalSpeed = np.zeros(capacity)
+        self.maxAltitude = np.zeros(capacity)
+        self.isLanding = np.zeros(capacity, dtype=bool)
 
     def random_traffic(self):
-        coin_flip = self.rng.randint(0, 2)
+        coin_flip = self.rng.integers(0, 2)
         if coin_flip == 0:
             return "landing"
         else:
@@ -136,25 +300,76 @@ class AirportTraffic:
 
     def random_speed(self):
         # generate a random number between 0-1 to scale vref or v2
-        return self.rng.random(1)
+        return self.rng.random()
+
+    # positions of the relevant traffic, for plotting
+    def positions(self):
+        return self.x[:self.numTraffic], self.y[:self.numTraffic]
+
+    def add_traffic(self, traffic):
+        if self.numTraffic == len(self.x):
+            self.grow()
+        i = self.numTraffic
+        self.x[i] = traffic.x
+        self.y[i] = traffic.y
+        self.targetX[i] = traffic.targetX
+        self.targetY[i] = traffic.targetY
+        self.speed[i] = traffic.speed
+        self.altitude[i] = traffic.altitude
+        self.verticalSpeed[i] = traffic.verticalSpeed
+        self.maxAltitude[i] = traffic.maxAltitude
+        self.isLanding[i] = type(traffic) is LandingTraffic
+        self.numTraffic += 1
+
+    def grow(self):
+        capacity = 2 * len(self.x)
+        self.x = np.resize(self.x, capacity)
+        self.y = np.resize(self.y, capacity)
+        self.targetX = np.resize(self.targetX, capacity)
+        self.targetY = np.resize(self.targetY, capacity)
+        self.speed = np.resize(self.speed, capacity)
+        self.altitude = np.resize(self.altitude, capacity)
+        self.verticalSpeed = np.resize(self.verticalSpeed, capacity)
+        self.maxAltitude = np.resize(self.maxAltitude, capacity)
+        self.isLanding = np.resize(self.isLanding, capacity)
+
+    # same as Airplane.flight() for all relevant traffic at once
+    def flight(self):
+        n = self.numTraffic
+        dx = self.targetX[:n] - self.x[:n]
+        dy = self.targetY[:n] - self.y[:n]
+        dist = np.sqrt(dx**2 + dy**2)
+        travel_dist = self.speed[:n] * self.simulationManager.timeStep
+        ratio = travel_dist / dist
+        new_x = self.x[:n] + dx * ratio
+        new_y = self.y[:n] + dy * ratio
 
-    def update(self):
+        # landing traffic is done when it overshoots the runway threshold, departing traffic when it is high enough
+        landing = self.isLanding[:n]
+        relevant = np.where(landing, (self.targetX[:n] - new_x) * dx >= 0, self.altitude[:n] <= self.maxAltitude[:n])
 
-        self.landingTraffic = 0
-        for traffic in self.relevantTraffic:
-            traffic.flight()
-            if not traffic.isRelevant:
-                self.relevantTraffic.remove(traffic)
-                if type(traffic) is DepartingTraffic:
-                    self.departingTraffic -= 1
-
-            # only traffic within 8 mile final as landing traffic for airspace closure purposes
-            if type(traffic) is LandingTraffic:
-                final_dist = math.sqrt((traffic.x - traffic.targetX)**2 + (traffic.y - traffic.targetY)**2)
-                if final_dist < 14816:
-                    # have to go with this rather inefficient approach, because there is an edge case where a plane
-                    # could not be removed if one is added at the same time
-                    self.landingTraffic += 1
+        self.x[:n] = new_x
+        self.y[:n] = new_y
+        self.altitude[:n] += self.verticalSpeed[:n] * self.simulationManager.timeStep
+        return relevant
+
+    def update(self):
+        n = self.numTraffic
+        relevant = self.flight()
+        landing = self.isLanding[:n]
+
+        # only traffic within 8 mile final as landing traffic for airspace closure purposes. This includes traffic that
+        # just landed
+        final_dist_sq = (self.x[:n] - self.targetX[:n])**2 + (self.y[:n] - self.targetY[:n])**2
+        self.landingTraffic = int(np.count_nonzero(landing & (final_dist_sq < 14816**2)))
+
+        # drop the traffic that is no longer relevant, keeping the order of the rest
+        if not np.all(relevant):
+            self.departingTraffic -= int(np.count_nonzero(~relevant & ~landing))
+            keep = np.flatnonzero(relevant)
+            for values in (self.x, self.y, self.targetX, self.targetY, self.speed, self.altitude, self.verticalSpeed, self.maxAltitude, self.isLanding):
+                values[:len(keep)] = values[keep]
+            self.numTraffic = len(keep)
 
         if self.simulationManager.currentTime >= self.nextTrafficInjection:
             # traffic injection
@@ -164,20 +379,36 @@ class AirportTraffic:
                 self.departingTraffic += 1
                 # 45 seconds from departing traffic appearing to appear at the departure
                 # end of the runway to simulate takeoff roll
-                self.departingTrafficSpawnTime = self.simulationManager.currentTime + 45
+                self.departingTrafficSpawnTimes.append(self.simulationManager.currentTime + 45)
             else:
                 speed_scale = self.random_speed()
-                traffic = LandingTraffic(self.airport, speed_scale, self.simulationManager)
-                self.relevantTraffic.append(traffic)
+                self.add_traffic(LandingTraffic(self.airport, speed_scale, self.simulationManager))
 
-        if self.simulationManager.currentTime >= self.departingTrafficSpawnTime != -1:
+        while len(self.departingTrafficSpawnTimes) != 0 and self.simulationManager.currentTime >= self.departingTrafficSpawnTimes[0]:
+            self.departingTrafficSpawnTimes.popleft()
             speed_scale = self.random_speed()
-            traffic = DepartingTraffic(self.airport, speed_scale, self.simulationManager)
-            self.relevantTraffic.append(traffic)
-            self.departingTrafficSpawnTime = -1
+            self.add_traffic(DepartingTraffic(self.airport, speed_scale, self.simulationManager))
+
+    def schedule_update(self, time):
+        self.simulationManager.schedule(time, SimulationManager.TRAFFIC, self.eventOrder, self.update_event)
+
+    def update_event(self):
+        self.update()
+
+        # airborne traffic has to be flown every tick. Without it, nothing happens until the next traffic injection or
+        # the departing traffic finishing its takeoff roll
+        if self.numTraffic != 0 or self.landingTraffic > 0:
+            self.schedule_update(self.simulationManager.tick_after(self.simulationManager.currentTime))
+        else:
+            next_time = self.nextTrafficInjection
+            if len(self.departingTrafficSpawnTimes) != 0:
+                next_time = min(next_time, self.departingTrafficSpawnTimes[0])
+            self.schedule_update(max(self.simulationManager.tick_at_or_after(next_time), self.simulationManager.tick_after(self.simulationManager.currentTime)))
 
 
 class Airplane:
+    __slots__ = ("speed", "altitude", "x", "y", "verticalSpeed", "simulationManager", "isRelevant", "targetX", "targetY",
+                 "maxAltitude")
 
     def __init__(self, speed, altitude, x, y, vertical_speed, simulation_manager: SimulationManager, target_x, target_y, max_altitude):
         self.speed = speed
@@ -216,6 +447,7 @@ class Airplane:
 
 
 class LandingTraffic(Airplane):
+    __slots__ = ()
 
     finalDistance = 18520  # 10 mile final in m
     initAltitude = 970.59207232116  # standard 3 deg glide at 10 mile final in m
@@ -242,11 +474,12 @@ class LandingTraffic(Airplane):
 
 
 class DepartingTraffic(Airplane):
+    __slots__ = ()
 
     finalAltitude = 457.2  # beyond 1500 ft, the traffic will no longer be relevant as separation will be >1000 ft
     maxV2 = 82.3111  # 160 kts in m/s
     minV2 = 66.8778  # 130 kts in m/s
-    verticalSpeed = 10.16  # 2000 ft/min in m/s
+    climbSpeed = 10.16  # 2000 ft/min in m/s
 
     def __init__(self, airport: Airport, speed_scale, simulation_manager: SimulationManager):
         rwy_norm_delta_x = (airport.x2 - airport.x1) / airport.rwyLength
@@ -263,4 +496,4 @@ class DepartingTraffic(Airplane):
             target_y = -rwy_norm_delta_x * 100000 + airport.y1
         v2 = speed_scale * (self.maxV2 - self.minV2) + self.minV2
         initAlt = 15.24  # 50 ft initial altitude at departure end of the runway. Minimum climb gradient allowed in most airline performance calculators
-        Airplane.__init__(self, v2, initAlt, init_x, init_y, self.verticalSpeed, simulation_manager, target_x, target_y, self.finalAltitude)
+        Airplane.__init__(self, v2, initAlt, init_x, init_y, self.climbSpeed, simulation_manager, target_x, target_y, self.finalAltitude)
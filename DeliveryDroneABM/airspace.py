@@ -0,0 +1,116 @@
+import math
+
+from simulationManager import SimulationManager
+
+
+# every runway of a scenario, each an Airport with its own AirportTraffic. The bounding boxes of the closure rectangles
+# of all runways, in both ops directions, are kept in a uniform grid, so a drone only checks the runways whose
+# closures are near its leg instead of every runway on the map
+class Airspace:
+
+    def __init__(self, simulation_manager: SimulationManager, airport_traffic, cell_size=None):
+        self.simulationManager = simulation_manager
+        self.airportTraffic = list(airport_traffic)  # traffic of each runway, the runway is its airport
+        self.givenCellSize = cell_size
+        for traffic in self.airportTraffic:
+            traffic.airport.airspace = self
+        self.build_grid()
+
+    # closures only move when a runway is reconfigured, so the grid is built once and again from Airport.set_runway()
+    def build_grid(self):
+        boxes = [self.closure_box(traffic.airport) for traffic in self.airportTraffic]
+        self.minX = min(box[0] for box in boxes)
+        self.minY = min(box[1] for box in boxes)
+
+        # about one closure box per cell by default
+        cell_size = self.givenCellSize
+        if cell_size is None:
+            cell_size = max(max(box[2] - box[0], box[3] - box[1]) for box in boxes)
+        self.cellSize = cell_size
+
+        self.cells = {}  # (i, j) -> indices of the runways with a closure overlapping that cell
+        for index, (min_x, min_y, max_x, max_y) in enumerate(boxes):
+            i_min, j_min = self.cell(min_x, min_y)
+            i_max, j_max = self.cell(max_x, max_y)
+            for i in range(i_min, i_max + 1):
+                for j in range(j_min, j_max + 1):
+                    self.cells.setdefault((i, j), []).append(index)
+
+    # called by a runway of this airspace after it is reconfigured. Legs already being flown keep their intervals
+    def runway_changed(self, airport):
+        self.build_grid()
+
+    # bounding box (min x, min y, max x, max y) of all closures of a runway
+    def closure_box(self, airport):
+        corners = []
+        for ops_direction in (1, 2):
+            for closure in (airport.approach_end_closure(ops_direction), airport.departure_end_closure(ops_direction)):
+                (ax, ay), (bx, by), (cx, cy) = closure.tolist()
+                # the fourth corner of the rectangle [a, b, c]
+                corners += [(ax, ay), (bx, by), (cx, cy), (ax + cx - bx, ay + cy - by)]
+        xs = [x for x, y in corners]
+        ys = [y for x, y in corners]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def cell(self, x, y):
+        return int((x - self.minX) // self.cellSize), int((y - self.minY) // self.cellSize)
+
+    # cells crossed by the segment from (x0, y0) to (x1, y1), walking from cell boundary to cell boundary
+    def segment_cells(self, x0, y0, x1, y1):
+        i, j = self.cell(x0, y0)
+        i_end, j_end = self.cell(x1, y1)
+        dx = x1 - x0
+        dy = y1 - y0
+        step_i = 1 if dx > 0 else -1
+        step_j = 1 if dy > 0 else -1
+
+        # fraction of the segment to the next cell boundary in x and y, and in between two boundaries
+        if dx != 0:
+            t_max_x = (self.minX + (i + (step_i > 0)) * self.cellSize - x0) / dx
+            t_delta_x = self.cellSize / abs(dx)
+        else:
+            t_max_x = t_delta_x = math.inf
+        if dy != 0:
+            t_max_y = (self.minY + (j + (step_j > 0)) * self.cellSize - y0) / dy
+            t_delta_y = self.cellSize / abs(dy)
+        else:
+            t_max_y = t_delta_y = math.inf
+
+        cells = [(i, j)]
+        while (i, j) != (i_end, j_end) and min(t_max_x, t_max_y) <= 1:
+            if t_max_x < t_max_y:
+                i += step_i
+                t_max_x += t_delta_x
+            else:
+                j += step_j
+                t_max_y += t_delta_y
+            cells.append((i, j))
+        return cells
+
+    # indices of the runways with a closure in one of the cells the segment crosses, in runway order
+    def runways_near(self, x0, y0, x1, y1):
+        found = set()
+        for cell in self.segment_cells(x0, y0, x1, y1):
+            found.update(self.cells.get(cell, ()))
+        return sorted(found)
+
+    # closure intervals along a leg from (x0, y0) toward (x1, y1) as (runway index, intervals) for every runway whose
+    # closures the leg crosses, with intervals as returned by Airport.leg_closures(). The leg is searched one cell
+    # past its end, which is enough as long as drones fly less than a cell per time step and overshoot the target
+    # by less than that
+    def leg_closures(self, x0, y0, x1, y1):
+        length = math.sqrt((x1 - x0)**2 + (y1 - y0)**2)
+        if length == 0:
+            end_x, end_y = x1, y1
+        else:
+            end_x = x1 + (x1 - x0) / length * self.cellSize
+            end_y = y1 + (y1 - y0) / length * self.cellSize
+
+        # intervals are along the whole line through the leg, only the part that is flown matters
+        leg_closures = []
+        for index in self.runways_near(x0, y0, end_x, end_y):
+            intervals = self.airportTraffic[index].airport.leg_closures(x0, y0, x1, y1)
+            if any(interval is not None and interval[1] >= 0 and interval[0] <= length + self.cellSize
+                   for closures in intervals for interval in closures):
+                leg_closures.append((index, intervals))
+        return tuple(leg_closures)
@@ -0,0 +1,111 @@
+import json
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from scenario import DEFAULT_CONFIG
+from simulation import Simulation
+
+# the parameters that are scaled up, and their values. All other parameters are those of the base config
+SCALING = {
+    "numDronesPerFacility": [4, 8, 16, 32],
+    "numDestination": [80, 160, 320, 640],
+    "numFacilities": [2, 4, 8, 16],
+    "airportTrafficDensity": [240, 120, 60, 30],
+}
+
+# shorter than a full run, so the whole suite takes minutes
+BENCHMARK_CONFIG = dict(DEFAULT_CONFIG, maxTime=20000)
+
+
+# peak resident memory of this process in MB
+def peak_memory():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KB elsewhere
+
+
+# number of agents updated on every tick by the fixed time step loop
+def num_agents(world):
+    num_drones = sum(len(facility.drones) for facility in world.facilities)
+    return len(world.facilities) + num_drones + len(world.destinations) + 2 * len(world.airspace.airportTraffic)
+
+
+# build and run config repeats times in this process. Times are the fastest of the repeats. Agent updates are agents
+# times ticks under either clock, the updates of the fixed time step loop the run stands for, so agent updates per
+# second compare across clocks and engines. Events are the events processed under the event driven clock, one event
+# can update a whole fleet or destination store, so they only compare between runs of the same engine
+def run_case(config, repeats=3):
+    memory_before = peak_memory()
+    build_times = []
+    run_times = []
+    for i in range(0, repeats):
+        start = time.perf_counter()
+        simulation = Simulation(config)
+        build_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        simulation.run()
+        run_times.append(time.perf_counter() - start)
+
+    sim = simulation.simulationManager
+    ticks = int(config["maxTime"] // config["timeStep"]) + 1
+    agent_updates = ticks * num_agents(simulation.world)
+    events = sim.eventCounter - len(sim.eventQueue) if sim.eventDriven else None
+    run_time = min(run_times)
+    return {"buildTime": min(build_times), "runTime": run_time, "ticks": ticks, "agentUpdates": agent_updates,
+            "ticksPerSecond": ticks / run_time, "agentUpdatesPerSecond": agent_updates / run_time,
+            "events": events, "eventsPerSecond": events / run_time if events is not None else None,
+            "peakMemoryMB": peak_memory(), "baseMemoryMB": memory_before}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# run every value of every scaled parameter on top of base_config and save the results as JSON to path. Every case
+# runs in a fresh worker process, one at a time, so the peak memory is that of the case and cases do not compete for
+# the CPU
+def run_benchmarks(path="benchmark.json", base_config=BENCHMARK_CONFIG, scaling=SCALING, repeats=3):
+    cases = [{name: value} for name, values in scaling.items() for value in values]
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(1, max_tasks_per_child=1) as executor:
+            result = executor.submit(run_case, dict(base_config, **case), repeats).result()
+        results.append(dict(case=case, **result))
+        events = "" if result["events"] is None else str(round(result["eventsPerSecond"])) + " events/s, "
+        print(str(case) + ": " + str(round(result["ticksPerSecond"])) + " ticks/s, " +
+              str(round(result["agentUpdatesPerSecond"])) + " agent updates/s, " + events + str(round(result["peakMemoryMB"], 1)) + " MB")
+
+    benchmark = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "python": platform.python_version(),
+                 "numpy": np.__version__, "platform": platform.platform(), "processor": platform.processor(),
+                 "repeats": repeats, "baseConfig": base_config, "results": results}
+    with open(path, "w") as file:
+        json.dump(benchmark, file, indent=2)
+    return benchmark
+
+
+# speedup in ticks per second of every case in both files, new over old
+def compare_benchmarks(old_path, new_path):
+    with open(old_path) as file:
+        old = {json.dumps(result["case"], sort_keys=True): result for result in json.load(file)["results"]}
+    with open(new_path) as file:
+        new = {json.dumps(result["case"], sort_keys=True): result for result in json.load(file)["results"]}
+    return {case: new[case]["ticksPerSecond"] / old[case]["ticksPerSecond"] for case in new if case in old}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        # python benchmark.py old.json new.json
+        for case, speedup in compare_benchmarks(sys.argv[1], sys.argv[2]).items():
+            print(case + ": " + str(round(speedup, 2)) + "x")
+    else:
+        run_benchmarks(sys.argv[1] if len(sys.argv) == 2 else "benchmark.json")
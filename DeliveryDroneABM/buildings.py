@@ -1,96 +1,196 @@
+import math
+from collections import deque
+
 import numpy as np
 
 from humans import Employee, Customer
+from randomStreams import RandomStream
+from simulationManager import SimulationManager
 
 
 class SendingFacility:
 
-    def __init__(self, employees: list[Employee], drones, x, y):
-        self.pendingDeliveries = []  # delivery that has not been started
-        self.activeDeliveries = []  # delivery in progress
-        self.idlingDrones = []  # idling drones
-        self.activeDrones = []  # active drones
+    def __init__(self, employees: list[Employee], drones, x, y, simulation_manager: SimulationManager):
+        self.pendingDeliveries = deque()  # delivery that has not been started, first in first out
+        self.activeDeliveries = {}  # delivery in progress by the drone flying it
+        self.idlingDrones = deque()  # idling drones, first in first out
+        self.activeDrones = set()  # active drones
 
         self.employees = employees  # employees working at the facility
+        self.freeEmployees = deque(employee for employee in employees if employee.isFree)  # employees not loading a drone
         self.drones = drones.copy()  # drones belonging to this facility
-        self.idlingDrones = drones.copy()  # set all drones to be idling as initial condition
+        self.idlingDrones.extend(drones)  # set all drones to be idling as initial condition
         self.x = x  # x location of the facility in m
         self.y = y  # y location of the facility in m
+        self.simulationManager = simulation_manager
+        self.dispatchScheduled = False  # if an update is already scheduled under the event driven clock
+        self.eventOrder = simulation_manager.next_agent_order()
 
         for i in range(0, len(drones)):
             drones[i].update_position(x, y)
 
     def request_delivery(self, dest):
         self.pendingDeliveries.append(dest)
+        self.simulationManager.pendingRequests += 1
+        self.request_dispatch()
 
-    def update(self):
+    # under the event driven clock, the facility is only updated on the tick after something that could allow a new
+    # delivery to start has happened
+    def request_dispatch(self):
+        if self.simulationManager.eventDriven and not self.dispatchScheduled:
+            self.dispatchScheduled = True
+            self.simulationManager.schedule(self.simulationManager.tick_after(self.simulationManager.currentTime), SimulationManager.FACILITY, self.eventOrder, self.dispatch_event)
+
+    def dispatch_event(self):
+        self.dispatchScheduled = False
+        self.update()
 
-        # find free employee
-        freeEmployee = []
-        for i in range(0, len(self.employees)):
-            if self.employees[i].isFree:
-                freeEmployee.append(self.employees[i])
-
-        if len(self.pendingDeliveries) != 0 and len(self.idlingDrones) != 0 and len(freeEmployee) != 0:
-            # if there are pending deliveries and idling drones, start delivery
-            assignedDrone = self.idlingDrones[0]
-            assignedDest = self.pendingDeliveries[0]
-            del self.idlingDrones[0]
-            del self.pendingDeliveries[0]
-            self.activeDrones.append(assignedDrone)
-            self.activeDeliveries.append(assignedDest)
-            assignedDrone.loading(assignedDest, freeEmployee[0])
+    # a new idling drone, e.g. added to a branch restored from a checkpoint
+    def add_drone(self, drone):
+        drone.update_position(self.x, self.y)
+        drone.set_base(self)
+        self.drones.append(drone)
+        self.idlingDrones.append(drone)
+        self.request_dispatch()
+
+    # employee is done loading a drone
+    def release_employee(self, employee):
+        employee.isFree = True
+        self.freeEmployees.append(employee)
+        self.request_dispatch()
+
+    def update(self):
+        # start as many deliveries as there are pending deliveries, idling drones and free employees for
+        while len(self.pendingDeliveries) != 0 and len(self.idlingDrones) != 0 and len(self.freeEmployees) != 0:
+            assignedDrone = self.idlingDrones.popleft()
+            assignedDest = self.pendingDeliveries.popleft()
+            self.activeDrones.add(assignedDrone)
+            self.activeDeliveries[assignedDrone] = assignedDest
+            self.simulationManager.pendingRequests -= 1
+            self.simulationManager.activeRequests += 1
+            assignedDrone.loading(assignedDest, self.freeEmployees.popleft())
 
     def job_complete(self, drone):
         self.activeDrones.remove(drone)
         self.idlingDrones.append(drone)
-        self.activeDeliveries.remove(drone.job)
+        del self.activeDeliveries[drone]
+        self.simulationManager.activeRequests -= 1
         self.update()
 
 
 class Destination:
+    __slots__ = ("nextRequestTime", "hasActiveRequest", "minRequestTime", "maxRequestTime", "x", "y", "rng", "facility",
+                 "customer", "requestWaiting", "requestTime", "eventOrder")
 
-    def __init__(self, min_request_time, max_request_time, x, y, seed, facility, customer: Customer):
+    # rng is the RandomStream of the times between requests, it can be shared by many destinations
+    def __init__(self, min_request_time, max_request_time, x, y, rng: RandomStream, facility, customer: Customer):
         self.nextRequestTime = 0  # next time a request is going to be made
         self.hasActiveRequest = False  # if the building has an active request
         self.minRequestTime = min_request_time  # max time between requests
         self.maxRequestTime = max_request_time  # min time between requests
         self.x = x  # x location of the destination in m
         self.y = y  # y location of the destination in m
-        self.rng = np.random.RandomState(seed)
-        self.nextRequestTime = self.rng.randint(0, min_request_time)
+        self.rng = rng
+        self.nextRequestTime = self.rng.integers(0, min_request_time)
         self.facility = facility  # the facility that the building is connected to
         self.customer = customer
+        self.requestWaiting = False  # if a request is due, but the previous one is not fulfilled yet
+        self.requestTime = -1  # time the last request was made
+        self.eventOrder = facility.simulationManager.next_agent_order()
 
     # active request if nextRequestTime is reached
     # t = current time
     def request_update(self, t):
         if t > self.nextRequestTime and not self.hasActiveRequest:
             self.hasActiveRequest = True
+            self.requestTime = t
             self.facility.request_delivery(self)
-            self.nextRequestTime += self.rng.randint(self.minRequestTime, self.maxRequestTime)
+            self.nextRequestTime += self.rng.integers(self.minRequestTime, self.maxRequestTime)
+
+    def request_complete(self):
+        self.hasActiveRequest = False
+        if self.requestWaiting:
+            # the request that was due is made on this tick
+            self.requestWaiting = False
+            sim = self.facility.simulationManager
+            sim.schedule(sim.currentTime, SimulationManager.DESTINATION, self.eventOrder, self.request_event)
+
+    def schedule_request(self):
+        sim = self.facility.simulationManager
+        time = max(sim.tick_after(self.nextRequestTime), sim.tick_after(sim.currentTime))
+        sim.schedule(time, SimulationManager.DESTINATION, self.eventOrder, self.request_event)
+
+    def request_event(self):
+        if self.hasActiveRequest:
+            self.requestWaiting = True
+        else:
+            self.request_update(self.facility.simulationManager.currentTime)
+            self.schedule_request()
 
 
 class Airport:
 
     def __init__(self, x1, y1, x2, y2, rwy_length, seed, min_wind_shift, max_wind_shift, simulation_manager):
+        self.rng = RandomStream(seed)
+        self.opsDirection = self.rng.integers(1, 3)  # which way traffic is flowing. 1 means flowing from 1 to 2, 2 means flowing from 2 to 1
+        self.nextWindChange = self.rng.integers(min_wind_shift, max_wind_shift)
+        self.minWindShift = min_wind_shift
+        self.maxWindShift = max_wind_shift
+        self.simulationManager = simulation_manager
+        self.eventOrder = simulation_manager.next_agent_order()
+        self.airspace = None  # Airspace indexing the closures of this runway, told when the runway is reconfigured
+        self.set_runway(x1, y1, x2, y2, rwy_length)
+
+    # closure polygons only depend on the runway and the ops direction, so they are built for both ops directions
+    # whenever the runway is configured and swapped in when the wind changes
+    def set_runway(self, x1, y1, x2, y2, rwy_length):
         self.x1 = x1
         self.y1 = y1
         self.x2 = x2
         self.y2 = y2
-        self.rng = np.random.RandomState(seed)
-        self.opsDirection = self.rng.randint(1, 3)  # which way traffic is flowing. 1 means flowing from 1 to 2, 2 means flowing from 2 to 1
-        self.nextWindChange = self.rng.randint(min_wind_shift, max_wind_shift)
-        self.minWindShift = min_wind_shift
-        self.maxWindShift = max_wind_shift
         self.rwyLength = rwy_length
-        self.simulationManager = simulation_manager
 
-    def approach_end_closure(self):
-        appr_x = self.x1 if self.opsDirection == 1 else self.x2
-        appr_y = self.y1 if self.opsDirection == 1 else self.y2
-        dep_x = self.x2 if self.opsDirection == 1 else self.x1
-        dep_y = self.y2 if self.opsDirection == 1 else self.y1
+        # [ops direction - 1] -> polygon, and edges for the rectangle test, see closure_edges()
+        self.approachClosures = [self.build_approach_end_closure(ops_direction) for ops_direction in (1, 2)]
+        self.departureClosures = [self.build_departure_end_closure(ops_direction) for ops_direction in (1, 2)]
+        self.approachEdges = [closure_edges(closure) for closure in self.approachClosures]
+        self.departureEdges = [closure_edges(closure) for closure in self.departureClosures]
+        self.set_ops_direction(self.opsDirection)
+        if self.airspace is not None:
+            self.airspace.runway_changed(self)
+
+    def set_ops_direction(self, ops_direction):
+        self.opsDirection = ops_direction
+        self.approachClosure = self.approachClosures[ops_direction - 1]
+        self.departureClosure = self.departureClosures[ops_direction - 1]
+        self.approachClosureEdges = self.approachEdges[ops_direction - 1]
+        self.departureClosureEdges = self.departureEdges[ops_direction - 1]
+
+    def approach_end_closure(self, ops_direction=None):
+        if ops_direction is None:
+            return self.approachClosure
+        return self.approachClosures[ops_direction - 1]
+
+    def departure_end_closure(self, ops_direction=None):
+        if ops_direction is None:
+            return self.departureClosure
+        return self.departureClosures[ops_direction - 1]
+
+    def approach_end_edges(self, ops_direction=None):
+        if ops_direction is None:
+            return self.approachClosureEdges
+        return self.approachEdges[ops_direction - 1]
+
+    def departure_end_edges(self, ops_direction=None):
+        if ops_direction is None:
+            return self.departureClosureEdges
+        return self.departureEdges[ops_direction - 1]
+
+    def build_approach_end_closure(self, ops_direction):
+        appr_x = self.x1 if ops_direction == 1 else self.x2
+        appr_y = self.y1 if ops_direction == 1 else self.y2
+        dep_x = self.x2 if ops_direction == 1 else self.x1
+        dep_y = self.y2 if ops_direction == 1 else self.y1
 
         # 1 mile to the left of the runway
         ax = -(dep_y - appr_y) / self.rwyLength * 1852 + appr_x
@@ -104,14 +204,15 @@ class Airport:
         cx = bx + (appr_x - dep_x) / self.rwyLength * 1852 * 5
         cy = by + (appr_y - dep_y) / self.rwyLength * 1852 * 5
 
-        return [[ax, ay], [bx, by], [cx, cy]]
+        closure = np.array([[ax, ay], [bx, by], [cx, cy]])
+        closure.flags.writeable = False
+        return closure
 
-    def departure_end_closure(self):
-
-        appr_x = self.x1 if self.opsDirection == 1 else self.x2
-        appr_y = self.y1 if self.opsDirection == 1 else self.y2
-        dep_x = self.x2 if self.opsDirection == 1 else self.x1
-        dep_y = self.y2 if self.opsDirection == 1 else self.y1
+    def build_departure_end_closure(self, ops_direction):
+        appr_x = self.x1 if ops_direction == 1 else self.x2
+        appr_y = self.y1 if ops_direction == 1 else self.y2
+        dep_x = self.x2 if ops_direction == 1 else self.x1
+        dep_y = self.y2 if ops_direction == 1 else self.y1
 
         # 1 mile to the left of the runway
         ax = -(dep_y - appr_y) / self.rwyLength * 1852 + appr_x
@@ -125,9 +226,65 @@ class Airport:
         cx = bx + (dep_x - appr_x) / self.rwyLength * 1852 * 3
         cy = by + (dep_y - appr_y) / self.rwyLength * 1852 * 3
 
-        return [[ax, ay], [bx, by], [cx, cy]]
+        closure = np.array([[ax, ay], [bx, by], [cx, cy]])
+        closure.flags.writeable = False
+        return closure
+
+    # a drone flies its leg in a straight line from (x0, y0) toward (x1, y1), so where it enters and exits each closure
+    # only has to be worked out once per leg. Returns ((departure, approach) for ops direction 1, (departure, approach)
+    # for ops direction 2), where each is the (entry, exit) distance along the leg in m, or None if the leg misses
+    # the closure. The drone keeps the intervals of the leg it is flying, so nothing is kept here and legs already
+    # being flown keep their intervals if the runway is reconfigured
+    def leg_closures(self, x0, y0, x1, y1):
+        return tuple((closure_interval(self.departure_end_edges(ops_direction), x0, y0, x1, y1),
+                      closure_interval(self.approach_end_edges(ops_direction), x0, y0, x1, y1))
+                     for ops_direction in (1, 2))
 
     def update(self):
         if self.simulationManager.currentTime >= self.nextWindChange:
-            self.opsDirection = 1 if self.opsDirection == 2 else 2
-            self.nextWindChange += self.rng.randint(self.minWindShift, self.maxWindShift)
\ No newline at end of file
+            self.set_ops_direction(1 if self.opsDirection == 2 else 2)
+            self.nextWindChange += self.rng.integers(self.minWindShift, self.maxWindShift)
+
+    def schedule_wind_change(self):
+        self.simulationManager.schedule(self.simulationManager.tick_at_or_after(self.nextWindChange), SimulationManager.AIRPORT, self.eventOrder, self.wind_change_event)
+
+    def wind_change_event(self):
+        self.update()
+        self.schedule_wind_change()
+
+
+# corner a, edge vector from a to b and its squared length, corner b, edge vector from b to c and its squared length of
+# a closure rectangle [a, b, c], as plain floats for the rectangle test in Drone.inside_rectangle
+def closure_edges(closure):
+    (ax, ay), (bx, by), (cx, cy) = closure.tolist()
+    return (ax, ay, bx - ax, by - ay, (bx - ax)**2 + (by - ay)**2,
+            bx, by, cx - bx, cy - by, (cx - bx)**2 + (cy - by)**2)
+
+
+# distances along the line from (x0, y0) toward (x1, y1) between which the line is inside the closure rectangle, using
+# the same rectangle test as Drone.inside_rectangle. The line extends past both ends, as drones can overshoot
+def closure_interval(edges, x0, y0, x1, y1):
+    length = math.sqrt((x1 - x0)**2 + (y1 - y0)**2)
+    if length == 0:
+        return None
+    ux = (x1 - x0) / length
+    uy = (y1 - y0) / length
+
+    s_in = -math.inf
+    s_out = math.inf
+    for px, py, edge_x, edge_y, edge_length_sq in (edges[0:5], edges[5:10]):
+        # projection onto the edge grows linearly along the line, and has to stay between 0 and the squared edge length
+        projection = edge_x * (x0 - px) + edge_y * (y0 - py)
+        rate = edge_x * ux + edge_y * uy
+        if rate == 0:
+            if not 0 <= projection <= edge_length_sq:
+                return None
+        else:
+            a = -projection / rate
+            b = (edge_length_sq - projection) / rate
+            s_in = max(s_in, min(a, b))
+            s_out = min(s_out, max(a, b))
+
+    if s_in > s_out:
+        return None
+    return s_in, s_out
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+
+from simulationManager import SimulationManager
+
+
+# closure state of every runway over time: if there is departing traffic, if there is landing traffic and the ops
+# direction, as seen by the drones. Airports and their traffic do not depend on the drones, so this only has to be
+# simulated once per airport seed and parameters. Each runway has its own sorted change times, state k of a runway
+# holds from its change time k until the next one. A change made by the airport and traffic updates of tick t is at
+# time t, the drones see it from the next tick on
+class ClosureTimeline:
+
+    def __init__(self, times, departing, landing, ops_direction, end_time):
+        self.times = times  # [runway] -> change times
+        self.departing = departing  # [runway] -> if there is departing traffic from each change time on
+        self.landing = landing  # [runway] -> if there is landing traffic within 8 mile final from each change time on
+        self.opsDirection = ops_direction  # [runway] -> ops direction from each change time on
+        self.endTime = end_time  # last tick simulated, the timeline is only known up to here
+
+    # index of the state of runway at time t, found by binary search
+    def state_index(self, runway, t):
+        return int(np.searchsorted(self.times[runway], t, side="right")) - 1
+
+    # (departing, landing, ops direction) of runway after the updates of the tick at time t
+    def state(self, runway, t):
+        k = self.state_index(runway, t)
+        return bool(self.departing[runway][k]), bool(self.landing[runway][k]), int(self.opsDirection[runway][k])
+
+    # every time at which any runway changes, in order
+    def change_times(self):
+        return np.unique(np.concatenate(self.times))
+
+    def save(self, path):
+        arrays = {"endTime": np.array(self.endTime)}
+        for runway in range(0, len(self.times)):
+            arrays["times" + str(runway)] = self.times[runway]
+            arrays["departing" + str(runway)] = self.departing[runway]
+            arrays["landing" + str(runway)] = self.landing[runway]
+            arrays["opsDirection" + str(runway)] = self.opsDirection[runway]
+        # written next to path and then moved, so workers sharing a cache never read a half written file
+        temp_path = path + "." + str(os.getpid()) + ".tmp.npz"
+        np.savez_compressed(temp_path, **arrays)
+        os.replace(temp_path, path)
+
+
+def load_closure_timeline(path):
+    with np.load(path) as arrays:
+        num_runways = sum(1 for name in arrays.files if name.startswith("times"))
+        return ClosureTimeline([arrays["times" + str(runway)] for runway in range(0, num_runways)],
+                               [arrays["departing" + str(runway)] for runway in range(0, num_runways)],
+                               [arrays["landing" + str(runway)] for runway in range(0, num_runways)],
+                               [arrays["opsDirection" + str(runway)] for runway in range(0, num_runways)],
+                               float(arrays["endTime"]))
+
+
+# run the airports and traffic of airport_traffic, built on simulation_manager and nothing else, with the fixed time
+# step loop up to end_time and record every change of their closure state
+def record_closure_timeline(airport_traffic, simulation_manager: SimulationManager, end_time):
+    sim = simulation_manager
+
+    def state(traffic):
+        return traffic.departingTraffic > 0, traffic.landingTraffic > 0, traffic.airport.opsDirection
+
+    last = [state(traffic) for traffic in airport_traffic]
+    changes = [[((sim.currentTick - 1) * sim.timeStep,) + last[runway]] for runway in range(0, len(airport_traffic))]
+    while sim.currentTime <= end_time:
+        # same order as Simulation.tick()
+        for traffic in airport_traffic:
+            traffic.airport.update()
+        for runway, traffic in enumerate(airport_traffic):
+            traffic.update()
+            current = state(traffic)
+            if current != last[runway]:
+                changes[runway].append((sim.currentTime,) + current)
+                last[runway] = current
+        sim.set_tick(sim.currentTick + 1)
+
+    return ClosureTimeline([np.array([change[0] for change in runway_changes]) for runway_changes in changes],
+                           [np.array([change[1] for change in runway_changes], dtype=bool) for runway_changes in changes],
+                           [np.array([change[2] for change in runway_changes], dtype=bool) for runway_changes in changes],
+                           [np.array([change[3] for change in runway_changes], dtype=np.int8) for runway_changes in changes],
+                           (sim.currentTick - 1) * sim.timeStep)
+
+
+# sets the closure state of the airports and traffic of a world from a ClosureTimeline instead of simulating them.
+# Only what the drones look at is replayed: the ops direction, and departingTraffic and landingTraffic, which are 1
+# while there is such traffic and 0 otherwise. No aircraft are flown, so there is no traffic to plot
+class ClosureReplay:
+
+    def __init__(self, simulation_manager: SimulationManager, timeline: ClosureTimeline, airport_traffic):
+        self.simulationManager = simulation_manager
+        self.timeline = timeline
+        self.airportTraffic = list(airport_traffic)
+        self.changeTimes = timeline.change_times()
+        self.cursor = 0  # first change time not replayed yet
+        self.eventOrder = simulation_manager.next_agent_order()
+
+        # state the drones see on the current tick
+        t = (simulation_manager.currentTick - 1) * simulation_manager.timeStep
+        self.apply(t)
+        self.cursor = int(np.searchsorted(self.changeTimes, t, side="right"))
+
+    # closure state of every runway after the updates of the tick at time t
+    def apply(self, t):
+        for runway, traffic in enumerate(self.airportTraffic):
+            departing, landing, ops_direction = self.timeline.state(runway, t)
+            traffic.departingTraffic = int(departing)
+            traffic.landingTraffic = int(landing)
+            if traffic.airport.opsDirection != ops_direction:
+                traffic.airport.set_ops_direction(ops_direction)
+
+    # replay every change up to the current time, in the traffic phase of the tick as the traffic updates would
+    def update(self):
+        t = self.simulationManager.currentTime
+        if t > self.timeline.endTime:
+            raise ValueError("closure timeline ends at " + str(self.timeline.endTime) + " s")
+        if self.cursor < len(self.changeTimes) and self.changeTimes[self.cursor] <= t:
+            self.apply(t)
+            self.cursor = int(np.searchsorted(self.changeTimes, t, side="right"))
+
+    # under the event driven clock, the replay is only updated at the change times, and once more after the end of the
+    # timeline to stop the run there
+    def schedule_update(self):
+        if self.cursor < len(self.changeTimes):
+            time = float(self.changeTimes[self.cursor])
+        else:
+            time = self.simulationManager.tick_after(self.timeline.endTime)
+        self.simulationManager.schedule(time, SimulationManager.TRAFFIC, self.eventOrder, self.update_event)
+
+    def update_event(self):
+        self.update()
+        self.schedule_update()
@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+# columns of a delivery record. drone is the update order of the drone, which is unique within a run. Times are in s,
+# the frozen times are the time the drone was held outside an airport closure on the way to the destination and on the
+# way back
+DELIVERY_COLUMNS = ["drone", "destinationX", "destinationY", "requestTime", "dispatchTime", "takeoffTime", "arrivalTime",
+                    "unloadedTime", "returnTime", "outboundFrozenTime", "returnFrozenTime"]
+
+
+# streams one record per finished delivery to a CSV file, or an Arrow IPC file if path ends in .arrow (needs pyarrow).
+# Records are collected in a preallocated chunk that is written out whenever it is full, so the log never holds more
+# than chunk_size records. Time to delivery, from request to arrival at the destination, is also counted in a
+# histogram with one bin per time step, so its percentiles are exact without keeping the records
+class DeliveryLog:
+
+    def __init__(self, simulation_manager, path, chunk_size=4096):
+        self.simulationManager = simulation_manager
+        self.chunk = np.zeros((chunk_size, len(DELIVERY_COLUMNS)))
+        self.size = 0  # number of records in the chunk
+        self.numDeliveries = 0
+        self.inProgress = {}  # drone -> times of the delivery it is flying, see status_changed()
+        self.latencyCounts = np.zeros(0, dtype=np.int64)  # number of deliveries by time to delivery in time steps
+        self.path = None
+        self.file = None
+        self.writer = None
+        self.open(path)
+
+    # records still in the chunk are dropped, as they belong to the file of the log this one was restored from, which
+    # writes them itself
+    def open(self, path):
+        self.size = 0
+        self.path = path
+        if path.endswith(".arrow"):
+            import pyarrow
+            import pyarrow.ipc
+
+            schema = pyarrow.schema([(name, pyarrow.float64()) for name in DELIVERY_COLUMNS])
+            self.writer = pyarrow.ipc.new_file(path, schema)
+        else:
+            self.file = open(path, "w")
+            self.file.write(",".join(DELIVERY_COLUMNS) + "\n")
+
+    # called by a drone after every status change
+    def status_changed(self, drone, status):
+        t = self.simulationManager.currentTime
+        if status == "loading":
+            # request, dispatch, takeoff and arrival time, and the frozen time of the drone at takeoff and arrival
+            self.inProgress[drone] = [drone.job.requestTime, t, math.nan, math.nan, math.nan, math.nan, math.nan]
+        elif drone not in self.inProgress:
+            return
+        elif status == "delivering":
+            times = self.inProgress[drone]
+            times[2] = t
+            times[5] = drone.frozenTime
+        elif status == "unloading":
+            times = self.inProgress[drone]
+            times[3] = t
+            times[6] = drone.frozenTime
+        elif status == "returning":
+            self.inProgress[drone][4] = t
+        elif status == "idling":
+            request, dispatch, takeoff, arrival, unloaded, frozen_takeoff, frozen_arrival = self.inProgress.pop(drone)
+            self.record((drone.eventOrder, drone.job.x, drone.job.y, request, dispatch, takeoff, arrival, unloaded, t,
+                         frozen_arrival - frozen_takeoff, drone.frozenTime - frozen_arrival))
+
+            steps = round((arrival - request) / self.simulationManager.timeStep)
+            if steps >= len(self.latencyCounts):
+                extra = max(steps + 1, 2 * len(self.latencyCounts)) - len(self.latencyCounts)
+                self.latencyCounts = np.concatenate((self.latencyCounts, np.zeros(extra, dtype=np.int64)))
+            self.latencyCounts[steps] += 1
+
+    def record(self, values):
+        self.chunk[self.size] = values
+        self.size += 1
+        self.numDeliveries += 1
+        if self.size == len(self.chunk):
+            self.flush()
+
+    # write out the records of the chunk. A log that writes nowhere, e.g. restored from a checkpoint, keeps them until
+    # its chunk is full
+    def flush(self):
+        if self.file is None and self.writer is None:
+            if self.size == len(self.chunk):
+                raise ValueError("delivery log has no file to write to, open() it on a new path, e.g. with "
+                                 "Simulation.fork(delivery_log_path)")
+            return
+        if self.size == 0:
+            return
+        records = self.chunk[:self.size]
+        if self.writer is not None:
+            import pyarrow
+
+            self.writer.write_batch(pyarrow.record_batch([records[:, i] for i in range(0, len(DELIVERY_COLUMNS))], names=DELIVERY_COLUMNS))
+        else:
+            np.savetxt(self.file, records, fmt="%.12g", delimiter=",")
+            self.file.flush()
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # time to delivery in s at the given percentiles, over all finished deliveries
+    def latency_percentiles(self, percentiles=(50, 95, 99)):
+        cumulative = np.cumsum(self.latencyCounts)
+        if len(cumulative) == 0 or cumulative[-1] == 0:
+            return {p: math.nan for p in percentiles}
+        # nearest rank, the smallest time to delivery with at least p percent of the deliveries at or below it
+        ranks = [max(math.ceil(p / 100 * cumulative[-1]), 1) for p in percentiles]
+        steps = np.searchsorted(cumulative, ranks)
+        return {p: float(step * self.simulationManager.timeStep) for p, step in zip(percentiles, steps)}
+
+    # checkpoints keep the statistics and the records not written yet, but not the open file. A restored log writes
+    # nowhere until open() is called with a new path
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["file"] = None
+        state["writer"] = None
+        state["path"] = None
+        return state
+
+
+# columns of a CSV or Arrow file written by a DeliveryLog
+def load_delivery_log(path):
+    if path.endswith(".arrow"):
+        import pyarrow
+        import pyarrow.ipc
+
+        with pyarrow.memory_map(path) as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+        return {name: table.column(name).to_numpy() for name in DELIVERY_COLUMNS}
+    data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    return {name: data[:, i] for i, name in enumerate(DELIVERY_COLUMNS)}
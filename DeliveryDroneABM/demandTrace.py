@@ -0,0 +1,122 @@
+import numpy as np
+
+from humans import Customer
+from simulationManager import SimulationManager
+from spatialIndex import FacilityIndex
+
+# an order trace file is this magic, the number of orders as a little endian uint64, and then one little endian float64
+# column after the other. Orders are sorted by time, which is in simulated s, and x and y are in m
+TRACE_MAGIC = b"DDTRACE1"
+TRACE_COLUMNS = ["time", "x", "y"]
+TRACE_HEADER_SIZE = len(TRACE_MAGIC) + 8
+
+
+# write the orders given by the columns to an order trace file, chunk_size orders at a time so the columns can be
+# memory maps themselves
+def write_trace(path, time, x, y, chunk_size=2**20):
+    columns = [time, x, y]
+    num_orders = len(time)
+    if len(x) != num_orders or len(y) != num_orders:
+        raise ValueError("trace columns have different lengths")
+    for start in range(0, num_orders, chunk_size):
+        # each chunk also includes the last time of the chunk before
+        chunk = np.asarray(time[max(start - 1, 0):start + chunk_size])
+        if np.any(np.diff(chunk) < 0):
+            raise ValueError("trace orders are not sorted by time")
+
+    with open(path, "wb") as file:
+        file.write(TRACE_MAGIC)
+        file.write(np.array([num_orders], dtype="<u8").tobytes())
+        for column in columns:
+            for start in range(0, num_orders, chunk_size):
+                file.write(np.asarray(column[start:start + chunk_size], dtype="<f8").tobytes())
+
+
+# columns of an order trace file by name, as read only memory maps. Nothing is read until the columns are accessed
+def open_trace(path):
+    with open(path, "rb") as file:
+        header = file.read(TRACE_HEADER_SIZE)
+    if len(header) != TRACE_HEADER_SIZE or header[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+        raise ValueError(path + " is not an order trace file")
+    num_orders = int(np.frombuffer(header[len(TRACE_MAGIC):], dtype="<u8")[0])
+    if num_orders == 0:
+        return {name: np.zeros(0) for name in TRACE_COLUMNS}
+    return {name: np.memmap(path, dtype="<f8", mode="r", offset=TRACE_HEADER_SIZE + 8 * num_orders * i, shape=(num_orders,))
+            for i, name in enumerate(TRACE_COLUMNS)}
+
+
+class TraceOrder:
+    # destination of one replayed order, connected to the closest facility. Has everything of a Destination that
+    # facilities and drones use, and is dropped once the delivery is done
+    __slots__ = ("x", "y", "facility", "customer", "requestTime", "hasActiveRequest")
+
+    def __init__(self, x, y, facility, customer: Customer, request_time):
+        self.x = x
+        self.y = y
+        self.facility = facility
+        self.customer = customer
+        self.requestTime = request_time
+        self.hasActiveRequest = True
+
+    def request_complete(self):
+        self.hasActiveRequest = False
+
+
+# replays the orders of an order trace file instead of synthetic requests. An order at time t is requested on the first
+# tick after t, the same as a Destination whose nextRequestTime is t. Orders are read from the memory mapped columns
+# batch_size at a time as the clock reaches them, so only the orders being requested are ever in memory. customers
+# gives the Customer of every facility whose orders are replayed, orders closest to any other facility are skipped
+class TraceDemand:
+
+    def __init__(self, simulation_manager: SimulationManager, path, facility_index: FacilityIndex, customers: dict, batch_size=4096):
+        self.simulationManager = simulation_manager
+        self.facilityIndex = facility_index
+        self.customers = customers  # facility -> Customer shared by its orders
+        self.batchSize = batch_size
+        self.path = path
+        self.columns = open_trace(path)
+        self.numOrders = len(self.columns["time"])
+        self.cursor = 0  # first order not requested yet
+        self.scheduledUpdates = set()  # times the trace is already scheduled to be updated under the event driven clock
+        self.eventOrder = simulation_manager.next_agent_order()
+
+    # request every order before the current time
+    def update(self):
+        t = self.simulationManager.currentTime
+        time = self.columns["time"]
+        if self.cursor == self.numOrders or time[self.cursor] >= t:
+            return
+        end = self.cursor + int(np.searchsorted(time[self.cursor:], t, side="left"))
+        for start in range(self.cursor, end, self.batchSize):
+            stop = min(start + self.batchSize, end)
+            for x, y in zip(self.columns["x"][start:stop].tolist(), self.columns["y"][start:stop].tolist()):
+                facility = self.facilityIndex.nearest(x, y)[0]
+                if facility in self.customers:
+                    facility.request_delivery(TraceOrder(x, y, facility, self.customers[facility], t))
+        self.cursor = end
+
+    # under the event driven clock, the trace is only updated on the ticks orders are requested
+    def schedule_requests(self):
+        if self.cursor < self.numOrders:
+            self.schedule_update(self.simulationManager.tick_after(float(self.columns["time"][self.cursor])))
+
+    def schedule_update(self, time):
+        if time not in self.scheduledUpdates:
+            self.scheduledUpdates.add(time)
+            self.simulationManager.schedule(time, SimulationManager.DESTINATION, self.eventOrder, self.update_event)
+
+    def update_event(self):
+        self.scheduledUpdates.discard(self.simulationManager.currentTime)
+        self.update()
+        self.schedule_requests()
+
+    # checkpoints keep the position in the trace, not the memory maps. The trace is opened again from the same path
+    # when the checkpoint is loaded
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["columns"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.columns = open_trace(self.path)
@@ -0,0 +1,176 @@
+import numpy as np
+
+from humans import Customer
+from randomStreams import RandomStream
+from simulationManager import SimulationManager
+
+
+class StoredDestination:
+    # a destination of a DestinationStore, made whenever a request is handed to a facility and dropped once the delivery
+    # is done. Has everything of a Destination that facilities and drones use. The position never changes, so it is
+    # copied in
+    __slots__ = ("store", "index", "x", "y")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+        self.x = float(store.x[index])
+        self.y = float(store.y[index])
+
+    @property
+    def facility(self):
+        return self.store.facilities[self.store.facility[self.index]]
+
+    @property
+    def customer(self):
+        return self.store.customers[self.store.facility[self.index]]
+
+    @property
+    def hasActiveRequest(self):
+        return self.store.hasActiveRequest[self.index]
+
+    @property
+    def requestTime(self):
+        return self.store.requestTime[self.index]
+
+    @property
+    def nextRequestTime(self):
+        return self.store.nextRequestTime[self.index]
+
+    def request_complete(self):
+        self.store.request_complete(self.index)
+
+
+# all destinations of a world in a few arrays instead of one Destination and one Customer object each, tens of bytes
+# per destination, for scenarios with millions of destinations. The customers of a catchment all draw from the same
+# stream with the same limits, so they are one shared Customer. Destinations are updated in one pass in the order they
+# were added, so the results are the same as with Destination objects
+class DestinationStore:
+
+    def __init__(self, simulation_manager: SimulationManager, min_request_time, max_request_time, capacity=16):
+        self.simulationManager = simulation_manager
+        self.minRequestTime = min_request_time
+        self.maxRequestTime = max_request_time
+        # facilities the destinations are connected to, and the stream of the times between requests and the customer
+        # of their catchment, indexed by facility
+        self.facilities = []
+        self.rngs = []
+        self.customers = []
+        self.facilityIndices = {}  # facility -> its index in facilities
+        self.size = 0  # number of destinations, the first size entries of each array are in use
+
+        self.x = np.zeros(capacity)  # x location of each destination in m
+        self.y = np.zeros(capacity)  # y location of each destination in m
+        self.facility = np.zeros(capacity, dtype=np.int32)
+        self.nextRequestTime = np.zeros(capacity)
+        self.requestTime = np.full(capacity, -1.0)  # time the last request was made
+        self.hasActiveRequest = np.zeros(capacity, dtype=bool)
+        self.requestWaiting = np.zeros(capacity, dtype=bool)  # if a request is due, but the previous one is not fulfilled yet
+        self.eventTime = np.full(capacity, np.inf)  # tick of the next request event of each destination, see Destination.schedule_request()
+
+        self.scheduledUpdates = set()  # times the store is already scheduled to be updated under the event driven clock
+        self.eventOrder = None  # update order of the first destination
+
+    # destinations connected to facility draw the times between requests from rng and are all served by customer. The
+    # same stream and customer can be given for many facilities
+    def add_catchment(self, facility, rng: RandomStream, customer: Customer):
+        self.facilityIndices[facility] = len(self.facilities)
+        self.facilities.append(facility)
+        self.rngs.append(rng)
+        self.customers.append(customer)
+
+    # same as building a Destination connected to facility, whose catchment has to be added first. Returns the index of
+    # the new destination
+    def add_destination(self, x, y, facility):
+        if self.size == len(self.x):
+            self.grow()
+        # every destination keeps its update order, so the agents added later are numbered as with Destination objects
+        order = self.simulationManager.next_agent_order()
+        if self.eventOrder is None:
+            self.eventOrder = order
+
+        i = self.size
+        self.x[i] = x
+        self.y[i] = y
+        self.facility[i] = self.facilityIndices[facility]
+        self.nextRequestTime[i] = self.rngs[self.facility[i]].integers(0, self.minRequestTime)
+        self.size += 1
+        return i
+
+    def grow(self):
+        capacity = 2 * len(self.x)
+        self.x = np.resize(self.x, capacity)
+        self.y = np.resize(self.y, capacity)
+        self.facility = np.resize(self.facility, capacity)
+        self.nextRequestTime = np.resize(self.nextRequestTime, capacity)
+        self.requestTime = np.resize(self.requestTime, capacity)
+        self.hasActiveRequest = np.resize(self.hasActiveRequest, capacity)
+        self.requestWaiting = np.resize(self.requestWaiting, capacity)
+        self.eventTime = np.resize(self.eventTime, capacity)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("destination index out of range")
+        return StoredDestination(self, index)
+
+    def __iter__(self):
+        for i in range(0, self.size):
+            yield StoredDestination(self, i)
+
+    # same as Destination.request_update() of destination i
+    def request_update(self, i, t):
+        if t > self.nextRequestTime[i] and not self.hasActiveRequest[i]:
+            self.hasActiveRequest[i] = True
+            self.requestTime[i] = t
+            facility = self.facility[i]
+            self.facilities[facility].request_delivery(StoredDestination(self, i))
+            self.nextRequestTime[i] += self.rngs[facility].integers(self.minRequestTime, self.maxRequestTime)
+
+    # every destination with a request due, as Destination.request_update() of every destination
+    def update(self):
+        t = self.simulationManager.currentTime
+        n = self.size
+        for i in np.flatnonzero((t > self.nextRequestTime[:n]) & ~self.hasActiveRequest[:n]).tolist():
+            self.request_update(i, t)
+
+    def request_complete(self, i):
+        self.hasActiveRequest[i] = False
+        if self.requestWaiting[i]:
+            # the request that was due is made on this tick
+            self.requestWaiting[i] = False
+            self.eventTime[i] = self.simulationManager.currentTime
+            self.schedule_update(self.simulationManager.currentTime)
+
+    # same as Destination.schedule_request() of every destination
+    def schedule_requests(self):
+        sim = self.simulationManager
+        n = self.size
+        self.eventTime[:n] = np.maximum(sim.ticks_after_times(self.nextRequestTime[:n]), sim.tick_after(sim.currentTime))
+        if n != 0:
+            self.schedule_update(float(np.min(self.eventTime[:n])))
+
+    def schedule_update(self, time):
+        if time not in self.scheduledUpdates:
+            self.scheduledUpdates.add(time)
+            self.simulationManager.schedule(time, SimulationManager.DESTINATION, self.eventOrder, self.update_event)
+
+    # Destination.request_event() of every destination whose event is due, in the order they were added
+    def update_event(self):
+        sim = self.simulationManager
+        t = sim.currentTime
+        self.scheduledUpdates.discard(t)
+        n = self.size
+        for i in np.flatnonzero(self.eventTime[:n] <= t).tolist():
+            if self.hasActiveRequest[i]:
+                self.requestWaiting[i] = True
+                self.eventTime[i] = np.inf
+            else:
+                self.request_update(i, t)
+                self.eventTime[i] = max(sim.tick_after(self.nextRequestTime[i]), sim.tick_after(t))
+
+        next_time = float(np.min(self.eventTime[:n]))
+        if next_time != np.inf:
+            self.schedule_update(next_time)
@@ -0,0 +1,393 @@
+import numpy as np
+
+from aircraft import ARRIVAL_TOLERANCE, Drone
+from simulationManager import SimulationManager, DRONE_STATUSES
+
+# drone status codes used by the fleet arrays
+IDLING = 0
+LOADING = 1
+DELIVERING = 2
+UNLOADING = 3
+RETURNING = 4
+STATUS_NAMES = DRONE_STATUSES
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+
+class FleetDrone(Drone):
+    # a drone whose position, target, speed, status and timer live in the arrays of a DroneFleet, so the whole fleet
+    # can be flown in one batched step. All the per object Drone methods still work on it
+    __slots__ = ("fleet", "index")
+
+    def __init__(self, fleet, index, simulation_manager: SimulationManager, max_speed, airspace):
+        self.fleet = fleet
+        self.index = index
+        Drone.__init__(self, simulation_manager, max_speed, airspace)
+
+    @property
+    def x(self):
+        return self.fleet.x[self.index]
+
+    @x.setter
+    def x(self, value):
+        self.fleet.x[self.index] = value
+
+    @property
+    def y(self):
+        return self.fleet.y[self.index]
+
+    @y.setter
+    def y(self, value):
+        self.fleet.y[self.index] = value
+
+    @property
+    def target(self):
+        return self.fleet.targets[self.index]
+
+    @target.setter
+    def target(self, value):
+        self.fleet.targets[self.index] = value
+        self.fleet.targetX[self.index] = np.nan if value is None else value.x
+        self.fleet.targetY[self.index] = np.nan if value is None else value.y
+
+    @property
+    def maxSpeed(self):
+        return self.fleet.speed[self.index]
+
+    @maxSpeed.setter
+    def maxSpeed(self, value):
+        self.fleet.speed[self.index] = value
+
+    @Drone.status.setter
+    def status(self, value):
+        Drone.status.fset(self, value)
+        self.fleet.status[self.index] = STATUS_CODES[value]
+
+    @property
+    def taskCompleteTime(self):
+        return self.fleet.taskCompleteTime[self.index]
+
+    @taskCompleteTime.setter
+    def taskCompleteTime(self, value):
+        self.fleet.taskCompleteTime[self.index] = value
+
+    @property
+    def frozenTime(self):
+        return self.fleet.frozenTime[self.index]
+
+    @frozenTime.setter
+    def frozenTime(self, value):
+        self.fleet.frozenTime[self.index] = value
+
+    @property
+    def lastFlightTime(self):
+        value = self.fleet.lastFlightTime[self.index]
+        return None if np.isnan(value) else value
+
+    @lastFlightTime.setter
+    def lastFlightTime(self, value):
+        self.fleet.lastFlightTime[self.index] = np.nan if value is None else value
+
+    @property
+    def nextFlightTime(self):
+        return self.fleet.nextFlightTime[self.index]
+
+    @nextFlightTime.setter
+    def nextFlightTime(self, value):
+        self.fleet.nextFlightTime[self.index] = value
+
+    @property
+    def legPosition(self):
+        return self.fleet.legPosition[self.index]
+
+    @legPosition.setter
+    def legPosition(self, value):
+        self.fleet.legPosition[self.index] = value
+
+    @property
+    def legClosures(self):
+        return self.fleet.legClosures[self.index]
+
+    @legClosures.setter
+    def legClosures(self, value):
+        self.fleet.legClosures[self.index] = value
+        value = () if value is None else value
+        if len(value) > self.fleet.closureRunway.shape[1]:
+            self.fleet.grow_closure_slots(len(value))
+        self.fleet.closureRunway[self.index] = 0
+        self.fleet.closureEntry[self.index] = np.nan
+        self.fleet.closureExit[self.index] = np.nan
+        for slot, (runway, intervals) in enumerate(value):
+            self.fleet.closureRunway[self.index, slot] = runway
+            for d in range(0, 2):
+                for k in range(0, 2):
+                    interval = intervals[d][k]
+                    self.fleet.closureEntry[self.index, slot, d, k] = np.nan if interval is None else interval[0]
+                    self.fleet.closureExit[self.index, slot, d, k] = np.nan if interval is None else interval[1]
+
+    # under the event driven clock, the whole fleet is updated at once
+    def schedule_update(self, time):
+        self.fleet.schedule_update(time)
+
+    # the values kept in the fleet arrays are pickled with the fleet, only the slots of the drone itself are pickled here
+    def __getstate__(self):
+        return None, {name: getattr(self, name) for name in FLEET_DRONE_SLOTS}
+
+    # second half of Drone.flight(), after the new position has been computed by the fleet
+    def finish_flight(self, new_x, new_y, freeze, overshoot, travel_dist):
+        if overshoot:
+            new_x = self.target.x
+            new_y = self.target.y
+            self.unloading() if self.status == "delivering" else self.job_complete()
+
+        if not freeze:
+            self.update_position(new_x, new_y)
+            self.legPosition += travel_dist
+
+
+# slots of a FleetDrone that are not backed by the fleet arrays
+FLEET_DRONE_SLOTS = FleetDrone.__slots__ + tuple(name for name in Drone.__slots__ if not isinstance(getattr(FleetDrone, name), property))
+
+
+class DroneFleet:
+
+    def __init__(self, simulation_manager: SimulationManager, airspace, capacity=16):
+        self.simulationManager = simulation_manager
+        self.airspace = airspace
+        self.drones = []
+        self.targets = []  # target object of each drone, the coordinates are in targetX and targetY
+        self.legClosures = []  # closure intervals along the leg of each drone, also in closureEntry and closureExit
+
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.targetX = np.full(capacity, np.nan)
+        self.targetY = np.full(capacity, np.nan)
+        self.speed = np.zeros(capacity)  # max speed of each drone in m/s
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.taskCompleteTime = np.full(capacity, -1.0)
+        self.legPosition = np.zeros(capacity)
+        self.frozenTime = np.zeros(capacity)  # total time each drone was held outside closures in s
+        self.lastFlightTime = np.full(capacity, np.nan)  # see Drone.lastFlightTime, NaN for None
+        self.nextFlightTime = np.zeros(capacity)  # see Drone.next_flight_time()
+        # one slot per runway whose closures the leg of the drone crosses. Unused slots have NaN intervals
+        self.closureRunway = np.zeros((capacity, 1), dtype=np.int64)  # [drone, slot] -> runway index in the airspace
+        self.closureEntry = np.full((capacity, 1, 2, 2), np.nan)  # [drone, slot, ops direction - 1, departure or approach]
+        self.closureExit = np.full((capacity, 1, 2, 2), np.nan)
+
+        self.scheduledUpdates = set()  # times the fleet is already scheduled to be updated under the event driven clock
+        self.eventOrder = simulation_manager.next_agent_order()
+
+    def add_drone(self, max_speed):
+        index = len(self.drones)
+        if index == len(self.x):
+            self.grow()
+        self.targets.append(None)
+        self.legClosures.append(None)
+        drone = FleetDrone(self, index, self.simulationManager, max_speed, self.airspace)
+        self.drones.append(drone)
+        return drone
+
+    def grow(self):
+        capacity = 2 * len(self.x)
+        self.x = np.resize(self.x, capacity)
+        self.y = np.resize(self.y, capacity)
+        self.targetX = np.resize(self.targetX, capacity)
+        self.targetY = np.resize(self.targetY, capacity)
+        self.speed = np.resize(self.speed, capacity)
+        self.status = np.resize(self.status, capacity)
+        self.taskCompleteTime = np.resize(self.taskCompleteTime, capacity)
+        self.legPosition = np.resize(self.legPosition, capacity)
+        self.frozenTime = np.resize(self.frozenTime, capacity)
+        self.lastFlightTime = np.resize(self.lastFlightTime, capacity)
+        self.nextFlightTime = np.resize(self.nextFlightTime, capacity)
+        self.closureRunway = np.resize(self.closureRunway, (capacity, self.closureRunway.shape[1]))
+        self.closureEntry = np.resize(self.closureEntry, (capacity,) + self.closureEntry.shape[1:])
+        self.closureExit = np.resize(self.closureExit, (capacity,) + self.closureExit.shape[1:])
+
+    # room for legs crossing the closures of up to slots runways
+    def grow_closure_slots(self, slots):
+        extra = slots - self.closureRunway.shape[1]
+        capacity = len(self.x)
+        self.closureRunway = np.concatenate((self.closureRunway, np.zeros((capacity, extra), dtype=np.int64)), axis=1)
+        self.closureEntry = np.concatenate((self.closureEntry, np.full((capacity, extra, 2, 2), np.nan)), axis=1)
+        self.closureExit = np.concatenate((self.closureExit, np.full((capacity, extra, 2, 2), np.nan)), axis=1)
+
+    def status_counts(self):
+        return np.bincount(self.status[:len(self.drones)], minlength=len(STATUS_NAMES))
+
+    def inside_rectangle(self, edges, px, py):
+        # same as Drone.inside_rectangle, but for arrays of points
+        ax, ay, abx, aby, ab_length_sq, bx, by, bcx, bcy, bc_length_sq = edges
+        w = abx * (px - ax) + aby * (py - ay)
+        y = bcx * (px - bx) + bcy * (py - by)
+
+        return (0 <= w) & (w <= ab_length_sq) & (0 <= y) & (y <= bc_length_sq)
+
+    def flight(self, index):
+        # calculate new position after traveling for the given drones. Same arithmetic as Drone.flight()
+        x = self.x[index]
+        y = self.y[index]
+        dx = self.targetX[index] - x
+        dy = self.targetY[index] - y
+        dist = np.sqrt(dx**2 + dy**2)
+        travel_dist = self.speed[index] * self.simulationManager.timeStep
+
+        # drones reaching or overshooting their target are snapped to it before anything is divided by the leg length
+        overshoot = dist <= travel_dist + ARRIVAL_TOLERANCE
+        ratio = travel_dist / np.where(overshoot, 1.0, dist)
+        new_x = np.where(overshoot, self.targetX[index], x + dx * ratio)
+        new_y = np.where(overshoot, self.targetY[index], y + dy * ratio)
+        step_dist = np.where(overshoot, dist, travel_dist)
+
+        # airspace closure due to landing and departing airport traffic, see Drone.flight()
+        freeze = np.zeros(len(index), dtype=bool)
+        airportTraffic = self.airspace.airportTraffic
+        departing = np.array([traffic.departingTraffic > 0 for traffic in airportTraffic])
+        landing = np.array([traffic.landingTraffic > 0 for traffic in airportTraffic])
+        if self.simulationManager.closureIntervals:
+            if np.any(departing) or np.any(landing):
+                ops = np.array([traffic.airport.opsDirection - 1 for traffic in airportTraffic])
+                for slot in range(0, self.closureRunway.shape[1]):
+                    runway = self.closureRunway[index, slot]
+                    freeze |= departing[runway] & self.entering_closure(index, slot, ops[runway], 0, step_dist)
+                    freeze |= landing[runway] & self.entering_closure(index, slot, ops[runway], 1, step_dist)
+        else:
+            # the closures of the few runways with traffic are checked for the whole fleet at once
+            for runway in np.flatnonzero(departing | landing):
+                airport = airportTraffic[runway].airport
+                if departing[runway]:
+                    edges = airport.departure_end_edges()
+                    freeze |= ~self.inside_rectangle(edges, x, y) & self.inside_rectangle(edges, new_x, new_y)
+                if landing[runway]:
+                    edges = airport.approach_end_edges()
+                    freeze |= ~self.inside_rectangle(edges, x, y) & self.inside_rectangle(edges, new_x, new_y)
+
+        return new_x, new_y, freeze, overshoot, travel_dist
+
+    # same as Drone.entering_closure() for the given drones and their closure slot, ops holds the ops direction - 1 of
+    # the runway in that slot for each drone and kind is 0 for departure and 1 for approach end closure. Legs that miss
+    # the closure have NaN intervals, which are never entered
+    def entering_closure(self, index, slot, ops, kind, step_dist):
+        entry = self.closureEntry[index, slot, ops, kind]
+        exit = self.closureExit[index, slot, ops, kind]
+        leg_position = self.legPosition[index]
+        next_leg_position = leg_position + step_dist
+        inside_now = (entry <= leg_position) & (leg_position <= exit)
+        inside_next = (entry <= next_leg_position) & (next_leg_position <= exit)
+        return ~inside_now & inside_next
+
+    # same as calling Drone.update() on every drone of the fleet in order
+    def update(self):
+        n = len(self.drones)
+        t = self.simulationManager.currentTime
+        status = self.status[:n]
+        task_complete_time = self.taskCompleteTime[:n]
+
+        loading_done = (status == LOADING) & (t > task_complete_time)
+        unloading_done = (status == UNLOADING) & (t > task_complete_time)
+        for i in np.flatnonzero(loading_done | unloading_done):
+            self.drones[i].start_leg()
+
+        # flying drones are only flown on their own ticks, see next_flight_times()
+        flying = (status == DELIVERING) | (status == RETURNING)
+        airborne = np.flatnonzero((flying & (self.nextFlightTime[:n] <= t)) | loading_done | unloading_done)
+        self.skip_steps(airborne)
+        new_x, new_y, freeze, overshoot, travel_dist = self.flight(airborne)
+        self.frozenTime[airborne[freeze]] += self.simulationManager.timeStep
+
+        # drones that only keep flying are moved together
+        plain = ~(loading_done[airborne] | unloading_done[airborne] | overshoot) & ~freeze
+        self.x[airborne[plain]] = new_x[plain]
+        self.y[airborne[plain]] = new_y[plain]
+        self.legPosition[airborne[plain]] += travel_dist[plain]
+
+        # drones changing status can free employees and start new deliveries, so they are handled one by one in the
+        # same order as the per drone update
+        for k in np.flatnonzero(loading_done[airborne] | unloading_done[airborne] | overshoot):
+            i = airborne[k]
+            drone = self.drones[i]
+            if loading_done[i]:
+                drone.status = "delivering"
+                drone.taskCompleteTime = -1.0
+                drone.base.release_employee(drone.employee)
+                drone.employee = None
+                drone.finish_flight(new_x[k], new_y[k], freeze[k], overshoot[k], travel_dist[k])
+            elif unloading_done[i]:
+                drone.status = "returning"
+                drone.taskCompleteTime = -1.0
+                drone.job.request_complete()
+                drone.finish_flight(new_x[k], new_y[k], freeze[k], overshoot[k], travel_dist[k])
+            else:
+                drone.finish_flight(new_x[k], new_y[k], freeze[k], overshoot[k], travel_dist[k])
+
+        status = self.status[:n]
+        still_flying = (status[airborne] == DELIVERING) | (status[airborne] == RETURNING)
+        self.next_flight_times(airborne[still_flying], freeze[still_flying])
+
+        if self.simulationManager.eventDriven:
+            flying = (status == DELIVERING) | (status == RETURNING)
+            if np.any(flying):
+                self.schedule_update(np.min(self.nextFlightTime[:n][flying]))
+            waiting = (status == LOADING) | (status == UNLOADING)
+            if np.any(waiting):
+                self.schedule_update(self.simulationManager.tick_after(np.min(self.taskCompleteTime[:n][waiting])))
+
+    # same as Drone.skip_steps() for the given drones
+    def skip_steps(self, index):
+        index = index[~np.isnan(self.lastFlightTime[index])]
+        if len(index) == 0:
+            return
+        steps = np.round((self.simulationManager.currentTime - self.lastFlightTime[index]) / self.simulationManager.timeStep) - 1
+        self.x[index], self.y[index] = self.positions_after(index, steps)
+        self.legPosition[index] += steps * self.speed[index] * self.simulationManager.timeStep
+        self.lastFlightTime[index] = np.nan
+
+    # positions of the given drones the given number of ticks after they were last flown, see Drone.position()
+    def positions_after(self, index, steps):
+        x = self.x[index]
+        y = self.y[index]
+        dx = self.targetX[index] - x
+        dy = self.targetY[index] - y
+        ratio = steps * self.speed[index] * self.simulationManager.timeStep / np.sqrt(dx**2 + dy**2)
+        return x + dx * ratio, y + dy * ratio
+
+    # positions of all drones after the drone updates of the tick at time, see Drone.position()
+    def positions(self, time):
+        n = len(self.drones)
+        x = self.x[:n].copy()
+        y = self.y[:n].copy()
+        last = self.lastFlightTime[:n]
+        steps = np.round((time - last) / self.simulationManager.timeStep)
+        index = np.flatnonzero(~np.isnan(last) & (steps > 0))
+        x[index], y[index] = self.positions_after(index, steps[index])
+        return x, y
+
+    # same as setting nextFlightTime to Drone.next_flight_time() for the given drones that were just flown. Drones
+    # are only flown every tick when the closure rectangles are tested directly, as their legs have no closure
+    # intervals to tell how far away the closures are
+    def next_flight_times(self, index, frozen):
+        sim = self.simulationManager
+        next_tick = sim.tick_after(sim.currentTime)
+        if not sim.analyticLegs or not sim.closureIntervals:
+            self.nextFlightTime[index] = next_tick
+            return
+
+        travel_dist = self.speed[index] * sim.timeStep
+        dist = np.sqrt((self.targetX[index] - self.x[index])**2 + (self.targetY[index] - self.y[index])**2)
+        steps = np.floor(dist / travel_dist) - 1
+        ahead = self.closureEntry[index] - self.legPosition[index][:, None, None, None]
+        with np.errstate(invalid="ignore"):
+            entry_steps = np.where(ahead > 0, np.ceil(ahead / travel_dist[:, None, None, None]) - 2, np.inf)
+        if entry_steps.size != 0:
+            steps = np.minimum(steps, entry_steps.min(axis=(1, 2, 3)))
+
+        self.nextFlightTime[index] = np.where(frozen, next_tick, (sim.currentTick + np.maximum(steps, 0) + 1) * sim.timeStep)
+        self.lastFlightTime[index] = np.where(frozen, np.nan, sim.currentTime)
+
+    def schedule_update(self, time):
+        if time not in self.scheduledUpdates:
+            self.scheduledUpdates.add(time)
+            self.simulationManager.schedule(time, SimulationManager.DRONE, self.eventOrder, self.update_event)
+
+    def update_event(self):
+        self.scheduledUpdates.discard(self.simulationManager.currentTime)
+        self.update()
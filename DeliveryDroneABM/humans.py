@@ -1,19 +1,35 @@
-import numpy as np
+from randomStreams import RandomStream
 
 
 class Employee:
+    __slots__ = ("loadingTime", "simulationManager", "free")
 
     def __init__(self, simulation_manager):
         self.loadingTime = simulation_manager.loadingTime  # time in seconds it takes for the employee to load a package
+        self.simulationManager = simulation_manager
+        self.free = False
         self.isFree = True  # is this employee working
 
+    # every change is counted by the simulation manager
+    @property
+    def isFree(self):
+        return self.free
+
+    @isFree.setter
+    def isFree(self, value):
+        if value != self.free:
+            self.simulationManager.freeEmployees += 1 if value else -1
+        self.free = value
+
 
 class Customer:
+    __slots__ = ("minUnloadingTime", "maxUnloadingTime", "rng")
 
-    def __init__(self, simulation_manager, seed):
+    # rng is the RandomStream of the unloading times, it can be shared by many customers
+    def __init__(self, simulation_manager, rng: RandomStream):
         self.minUnloadingTime = simulation_manager.minUnloadingTime
         self.maxUnloadingTime = simulation_manager.maxUnloadingTime
-        self.rng = np.random.RandomState(seed)
+        self.rng = rng
 
     def get_unloading_time(self):
-        return self.rng.randint(self.minUnloadingTime, self.maxUnloadingTime)
\ No newline at end of file
+        return self.rng.integers(self.minUnloadingTime, self.maxUnloadingTime)
\ No newline at end of file
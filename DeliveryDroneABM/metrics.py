@@ -0,0 +1,64 @@
+import numpy as np
+
+
+# logged data as preallocated NumPy columns, one row per logging time. Columns are sized from maxTime / loggingRate
+# up front and only grow if the run goes past maxTime
+class MetricsRecorder:
+
+    def __init__(self, max_time, logging_rate):
+        self.capacity = int(max_time // logging_rate) + 1
+        self.size = 0  # number of rows recorded
+        self.columns = {}  # name -> preallocated column
+        self.counters = {}  # name -> function of the world counting something at every logging time, see add_counter()
+
+    def add_column(self, name, dtype=np.int64):
+        self.columns[name] = np.zeros(self.capacity, dtype=dtype)
+
+    # counter is called with the world every time a row is recorded, and its result is stored in column name. Counters
+    # have to be module level functions or callable objects for the simulation to be checkpointed
+    def add_counter(self, name, counter, dtype=np.int64):
+        self.add_column(name, dtype)
+        self.counters[name] = counter
+
+    def record(self, world, **values):
+        if self.size == self.capacity:
+            self.grow()
+        for name, value in values.items():
+            self.columns[name][self.size] = value
+        for name, counter in self.counters.items():
+            self.columns[name][self.size] = counter(world)
+        self.size += 1
+
+    def grow(self):
+        self.capacity *= 2
+        for name in self.columns:
+            self.columns[name] = np.resize(self.columns[name], self.capacity)
+
+    # recorded part of a column
+    def column(self, name):
+        return self.columns[name][:self.size]
+
+    def as_dict(self):
+        return {name: self.column(name).copy() for name in self.columns}
+
+    def save(self, path):
+        if path.endswith(".parquet"):
+            self.save_parquet(path)
+        else:
+            self.save_npz(path)
+
+    def save_npz(self, path):
+        np.savez_compressed(path, **self.as_dict())
+
+    # needs pyarrow, which is only imported when saving to Parquet
+    def save_parquet(self, path):
+        import pyarrow
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(pyarrow.table(self.as_dict()), path)
+
+
+# columns of a file written by MetricsRecorder.save_npz()
+def load_npz(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -0,0 +1,61 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from scenario import DEFAULT_CONFIG, closure_timeline, replication_seeds
+from simulation import LOG_KEYS, Simulation
+
+# A facility, its drones and employees and the destinations connected to it (its catchment) only interact with the
+# other catchments through the airspace. Airports and their traffic do not depend on the drones at all, so every
+# worker simulates them itself from the same seeds and gets the same closure state on every tick as every other
+# worker, without any messages between the workers. The workers then never have to wait for each other and each runs
+# its catchments to maxTime on its own. With closureTimeline, the airports are simulated once in the parent and every
+# worker replays the cached closure timeline instead. With catchmentStreams, the results only depend on the config,
+# not on how the catchments are split over the workers
+
+
+# facility indices of every worker, dealt out in turn so every worker gets about the same number of facilities
+def split_catchments(num_facilities, num_workers):
+    return [list(range(worker, num_facilities, num_workers)) for worker in range(0, num_workers)]
+
+
+# build and run the given catchments of config in this process
+def run_catchments(config, catchments, replication=None):
+    return Simulation(config, replication, catchments).run()
+
+
+# logged quantities of all catchments. The counts add up, the logging times are the same in every catchment
+def merge_results(results):
+    merged = {key: sum(result[key] for result in results) for key in LOG_KEYS if key != "time"}
+    merged["time"] = results[0]["time"]
+    for result in results:
+        if not np.array_equal(result["time"], merged["time"]):
+            raise ValueError("catchments were logged at different times")
+    return merged
+
+
+# run config with its catchments split over num_workers worker processes, by default one per CPU, and return the merged
+# logged quantities, the same as Simulation(dict(config, catchmentStreams=True), replication).run(). Counters added with
+# Simulation.add_counter() are not logged
+def run_parallel(config, num_workers=None, replication=None):
+    config = dict(DEFAULT_CONFIG, **config)
+    config["catchmentStreams"] = True
+    if num_workers is None:
+        num_workers = os.cpu_count()
+    num_workers = max(min(num_workers, config["numFacilities"]), 1)
+
+    if config["closureTimeline"] and config["closureTimelineCache"] is not None:
+        closure_timeline(config, replication_seeds(config, replication)[3])
+    splits = split_catchments(config["numFacilities"], num_workers)
+    with ProcessPoolExecutor(num_workers) as executor:
+        results = list(executor.map(run_catchments, [config] * num_workers, splits, [replication] * num_workers))
+    return merge_results(results)
+
+
+if __name__ == "__main__":
+    # python parallel.py [number of workers]
+    results = run_parallel(DEFAULT_CONFIG, int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print("Average number of idling drones: " + str(np.average(results["idlingDrones"])))
+    print("Average number of pending requests: " + str(np.average(results["pendingRequests"])))
@@ -0,0 +1,99 @@
+import cProfile
+import json
+import marshal
+import math
+import time
+
+
+# wall time and number of calls of every subsystem of the simulation loop (facilities, drones, destinations, airport,
+# traffic and logging), in total and per window of simulated time. cProfile can be switched on for some windows of
+# simulated time as well. Only used while attached to a SimulationManager, see Simulation.profile()
+class SubsystemProfiler:
+
+    def __init__(self, window=None, profile_windows=()):
+        self.window = window  # simulated seconds per window of the breakdown by window, None for totals only
+        self.profileWindows = sorted(profile_windows)  # (start, end) simulated times between which cProfile runs
+        self.totals = {}  # subsystem -> [wall time in s, calls]
+        self.windows = []  # {"start", "end", "subsystems"} of every window of simulated time
+        self.windowTotals = None  # subsystem -> [wall time in s, calls] of the current window
+        self.windowEnd = -math.inf
+        self.profiler = None  # cProfile.Profile of the current profile window
+        self.profileStart = None
+        self.profileEnd = math.inf
+        self.nextProfileWindow = 0  # index of the first profile window not started yet
+        self.profiles = []  # (start, end, raw cProfile stats) of every finished profile window
+
+    # called with the simulated time before each tick or event
+    def set_time(self, t):
+        if self.window is not None and t >= self.windowEnd:
+            start = t // self.window * self.window
+            self.windowEnd = start + self.window
+            self.windowTotals = {}
+            self.windows.append({"start": start, "end": self.windowEnd, "subsystems": self.windowTotals})
+
+        if self.profiler is not None and t >= self.profileEnd:
+            self.stop_profile()
+        while self.profiler is None and self.nextProfileWindow < len(self.profileWindows) and t >= self.profileWindows[self.nextProfileWindow][0]:
+            start, end = self.profileWindows[self.nextProfileWindow]
+            self.nextProfileWindow += 1
+            if t < end:
+                self.profileStart = start
+                self.profileEnd = end
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+
+    def stop_profile(self):
+        self.profiler.disable()
+        self.profiler.create_stats()
+        self.profiles.append((self.profileStart, self.profileEnd, self.profiler.stats))
+        self.profiler = None
+        self.profileEnd = math.inf
+
+    # call update() and charge its wall time to subsystem
+    def call(self, subsystem, update):
+        start = time.perf_counter()
+        update()
+        elapsed = time.perf_counter() - start
+
+        entry = self.totals.setdefault(subsystem, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+        if self.windowTotals is not None:
+            entry = self.windowTotals.setdefault(subsystem, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+    # table of the subsystems, slowest first
+    def summary(self):
+        total = sum(elapsed for elapsed, calls in self.totals.values())
+        lines = ["subsystem".ljust(14) + "calls".rjust(12) + "time (s)".rjust(12) + "per call (us)".rjust(15) + "share".rjust(8)]
+        for subsystem, (elapsed, calls) in sorted(self.totals.items(), key=lambda item: -item[1][0]):
+            lines.append(subsystem.ljust(14) + str(calls).rjust(12) + str(round(elapsed, 3)).rjust(12) +
+                         str(round(elapsed / calls * 1e6, 2)).rjust(15) + (str(round(100 * elapsed / total, 1)) + "%").rjust(8))
+        return "\n".join(lines)
+
+    # totals and windows as JSON to path, and the cProfile output of every profile window to path.<start>-<end>.prof,
+    # which can be read with pstats
+    def save(self, path):
+        if self.profiler is not None:
+            self.stop_profile()
+        profile_paths = []
+        for start, end, stats in self.profiles:
+            profile_path = path + "." + str(start) + "-" + str(end) + ".prof"
+            with open(profile_path, "wb") as file:
+                marshal.dump(stats, file)
+            profile_paths.append(profile_path)
+
+        def subsystems(totals):
+            return {subsystem: {"time": elapsed, "calls": calls} for subsystem, (elapsed, calls) in totals.items()}
+
+        with open(path, "w") as file:
+            json.dump({"subsystems": subsystems(self.totals),
+                       "windows": [{"start": window["start"], "end": window["end"], "subsystems": subsystems(window["subsystems"])} for window in self.windows],
+                       "profiles": profile_paths}, file, indent=2)
+
+    # a running cProfile.Profile cannot be pickled, so a checkpoint ends the current profile window
+    def __getstate__(self):
+        if self.profiler is not None:
+            self.stop_profile()
+        return self.__dict__
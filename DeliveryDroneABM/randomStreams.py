@@ -0,0 +1,30 @@
+import numpy as np
+
+
+# random numbers drawn from a NumPy Generator in blocks and handed out one at a time, so the agents do not pay for a
+# generator call per draw and many agents can share one stream instead of owning a generator each. Every variate is
+# built from one uniform double of the block, so the sequence only depends on the seed, not on the block size or on
+# what the earlier draws were used for
+class RandomStream:
+
+    def __init__(self, seed, block_size=4096):
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self.blockSize = block_size
+        self.block = []  # uniform doubles in [0, 1) not handed out yet, as floats for fast access
+        self.position = 0  # next value of the block to hand out
+
+    def refill(self):
+        self.block = self.generator.random(self.blockSize).tolist()
+        self.position = 0
+
+    # uniform float in [0, 1)
+    def random(self):
+        if self.position == len(self.block):
+            self.refill()
+        value = self.block[self.position]
+        self.position += 1
+        return value
+
+    # uniform integer in [low, high), like RandomState.randint(low, high)
+    def integers(self, low, high):
+        return low + int(self.random() * (high - low))
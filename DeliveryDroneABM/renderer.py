@@ -0,0 +1,114 @@
+import numpy as np
+from matplotlib import animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from droneFleet import IDLING
+
+
+# draws a Simulation with a few persistent artists whose data is replaced on every frame, instead of clearing the axes
+# and plotting every agent again. The model is advanced with Simulation.run_until() between frames and is never
+# updated by the drawing, so any clock works and frameTime simulated seconds can pass between two frames
+class Renderer:
+
+    def __init__(self, simulation, frame_time=None):
+        self.simulation = simulation
+        self.frameTime = simulation.simulationManager.timeStep if frame_time is None else frame_time
+        self.startTime = simulation.nextTick  # time of the first frame
+        self.figure = None
+        self.ax = None
+        self.artists = {}
+
+    # persistent artists on a new axes of figure. Only the destinations, drones, traffic and clock change from frame
+    # to frame
+    def setup(self, figure):
+        world = self.simulation.world
+        config = self.simulation.config
+        self.figure = figure
+        self.ax = figure.add_subplot()
+        self.ax.set_xlim(0, config["mapX"])
+        self.ax.set_ylim(0, config["mapY"])
+        self.ax.set_aspect("equal")
+
+        for airportTraffic in world.airspace.airportTraffic:
+            airport = airportTraffic.airport
+            self.ax.plot([airport.x1, airport.x2], [airport.y1, airport.y2], color="tab:blue")
+        self.ax.scatter([facility.x for facility in world.facilities], [facility.y for facility in world.facilities], color="red", zorder=3)
+
+        self.artists = {
+            "destinations": self.ax.scatter(*self.destination_positions(), s=12, color="black"),
+            "drones": self.ax.scatter([], [], marker="x", color="black", zorder=4),
+            "traffic": self.ax.scatter([], [], marker="+", s=80, color="red", zorder=4),
+            "time": self.ax.text(0.02, 0.98, "", transform=self.ax.transAxes, verticalalignment="top"),
+        }
+        return list(self.artists.values())
+
+    def num_frames(self, end_time=None):
+        if end_time is None:
+            end_time = self.simulation.config["maxTime"]
+        return int((end_time - self.startTime) // self.frameTime) + 1
+
+    # advance the model to the time of frame i and update the artists to it
+    def draw_frame(self, i):
+        time = self.startTime + i * self.frameTime
+        self.simulation.run_until(time)
+
+        colors = np.where(self.destination_requests()[:, None], [0.0, 0.0, 1.0, 1.0], [0.0, 0.0, 0.0, 1.0])
+        self.artists["destinations"].set_facecolors(colors)
+        self.artists["destinations"].set_edgecolors(colors)
+        self.artists["drones"].set_offsets(self.drone_positions(time))
+        self.artists["traffic"].set_offsets(self.traffic_positions())
+        self.artists["time"].set_text("t = " + str(round(time)) + " s")
+        return list(self.artists.values())
+
+    def destination_positions(self):
+        store = self.simulation.world.destinationStore
+        if store is not None:
+            return store.x[:store.size], store.y[:store.size]
+        destinations = self.simulation.world.destinations
+        return [dest.x for dest in destinations], [dest.y for dest in destinations]
+
+    # if each destination has an active request
+    def destination_requests(self):
+        store = self.simulation.world.destinationStore
+        if store is not None:
+            return store.hasActiveRequest[:store.size]
+        return np.array([dest.hasActiveRequest for dest in self.simulation.world.destinations], dtype=bool)
+
+    # positions of the drones that are not idling at their facility, as an (n, 2) array
+    def drone_positions(self, time):
+        world = self.simulation.world
+        droneFleet = world.droneFleet
+        if droneFleet is not None:
+            n = len(droneFleet.drones)
+            flying = droneFleet.status[:n] != IDLING
+            x, y = droneFleet.positions(time)
+            return np.column_stack((x[flying], y[flying]))
+        positions = [drone.position(time) for facility in world.facilities for drone in facility.drones if drone.status != "idling"]
+        return np.array(positions).reshape(-1, 2)
+
+    def traffic_positions(self):
+        positions = [np.column_stack(airportTraffic.positions()) for airportTraffic in self.simulation.world.airspace.airportTraffic]
+        return np.concatenate(positions)
+
+    # interactive window, blitting only the artists that change
+    def show(self, end_time=None, interval=100):
+        from matplotlib import pylab as plt
+
+        figure = plt.figure()
+        artists = self.setup(figure)
+        a = animation.FuncAnimation(figure, self.draw_frame, init_func=lambda: artists, frames=self.num_frames(end_time), interval=interval, blit=True)
+        plt.show()
+        return a
+
+    # render off screen with the Agg backend and write the frames to a video. .gif files are written with Pillow,
+    # everything else (e.g. .mp4) with ffmpeg, which has to be installed
+    def save(self, path, end_time=None, fps=30, dpi=100):
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        self.setup(figure)
+        writer = animation.PillowWriter(fps=fps) if path.endswith(".gif") else animation.FFMpegWriter(fps=fps)
+        with writer.saving(figure, path, dpi):
+            for i in range(0, self.num_frames(end_time)):
+                self.draw_frame(i)
+                writer.grab_frame()
@@ -0,0 +1,45 @@
+import math
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from scenario import DEFAULT_CONFIG
+from simulation import Simulation
+
+# logged quantities that are averaged over each replication
+SUMMARY_KEYS = ["idlingDrones", "activeDrones", "pendingRequests", "activeRequests", "freeEmployees"]
+
+
+# build a fresh world with the seed streams of this replication, run it and average the logged quantities
+def run_replication(config, replication):
+    results = Simulation(config, replication).run()
+    return {key: float(np.average(results[key])) for key in SUMMARY_KEYS}
+
+
+# mean and half width of the confidence interval of the mean. Uses the normal approximation, which is fine for the
+# hundreds of replications this is meant for
+def confidence_interval(values, confidence=0.95):
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, math.inf
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    return mean, z * statistics.stdev(values) / math.sqrt(len(values))
+
+
+# run replications 0 to num_replications - 1 in parallel worker processes. Returns the confidence interval of each
+# summary quantity, and the summaries of the individual replications in replication order
+def run_replications(config, num_replications, max_workers=None, confidence=0.95):
+    with ProcessPoolExecutor(max_workers) as executor:
+        summaries = list(executor.map(run_replication, [config] * num_replications, range(0, num_replications)))
+
+    intervals = {key: confidence_interval([summary[key] for summary in summaries], confidence) for key in SUMMARY_KEYS}
+    return intervals, summaries
+
+
+if __name__ == "__main__":
+    numReplications = 20
+    intervals, summaries = run_replications(DEFAULT_CONFIG, numReplications)
+    for key in SUMMARY_KEYS:
+        mean, halfWidth = intervals[key]
+        print("Average number of " + key + ": " + str(mean) + " +/- " + str(halfWidth) + " (95%, " + str(numReplications) + " replications)")
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+from aircraft import Drone, AirportTraffic
+from airspace import Airspace
+from buildings import SendingFacility, Destination, Airport
+from closureTimeline import ClosureReplay, load_closure_timeline, record_closure_timeline
+from demandTrace import TraceDemand
+from destinationStore import DestinationStore
+from droneFleet import DroneFleet
+from humans import Employee, Customer
+from randomStreams import RandomStream
+from simulationManager import SimulationManager
+from spatialIndex import FacilityIndex
+
+# parameters of a scenario. Copy and change this to build other scenarios
+DEFAULT_CONFIG = {
+    "mapX": 20000,  # size of the map in x in m
+    "mapY": 20000,  # size of the map in y in m
+    "droneSpeed": 26.8224,  # drone speed in m/s (60 mph)
+    "maxRequestTime": 7200,  # maximum time in between requests
+    "minRequestTime": 3600,  # minimum time in between requests
+    "maxTime": 50000,  # simulation end time in seconds
+    "timeStep": 1.0,  # time step in seconds
+    "airportTrafficDensity": 120,  # one flight every this many seconds
+    "minWindShift": 7200,  # minimum time between an ops direction change occurring at airport
+    "maxWindShift": 36000,  # maximum time between an ops direction change occurring at airport
+    "rwyLength": 10000 * 0.3048,  # RWY length in meters
+    "numAirports": 1,  # number of airports
+    "numRunways": 1,  # number of parallel runways per airport, each with its own traffic
+    "rwySpacing": 1310,  # distance between the centerlines of parallel runways in meters
+    "numFacilities": 2,  # number of facilities
+    "numEmployeesPerFacility": 2,  # number of employees per facility
+    "numDronesPerFacility": 8,  # number of drones per facility
+    "numDestination": 80,  # number of destination per facility
+    "seeds": [5738431, 3191933, 6838294, 1589563],  # seeds of rng1 (layout), rng2 (requests), rng3 (unloading) and rng4 (airports)
+    "loggingRate": 100,  # 1 data point every this many seconds
+    "eventDriven": True,  # jump the clock from event to event instead of updating every agent on every tick
+    "vectorizedDrones": False,  # keep all drones in one DroneFleet and fly them in one batched step
+    "compactDestinations": False,  # keep all destinations in the arrays of one DestinationStore instead of one object each
+    "demandTrace": None,  # order trace file replayed instead of the synthetic destinations, see demandTrace.py
+    "catchmentStreams": False,  # every facility has its own request and unloading streams, so its catchment can be simulated on its own
+    "closureTimeline": False,  # replay the airports from a precomputed closure timeline instead of simulating their traffic, see closureTimeline.py
+    "closureTimelineCache": "closureTimelines",  # directory closure timelines are cached in, None to always simulate them
+}
+
+# settings that only choose how a scenario is simulated. Every choice gives the same results
+ENGINE_KEYS = ["eventDriven", "vectorizedDrones", "compactDestinations", "closureTimeline", "closureTimelineCache"]
+
+# parameters the airports and their traffic depend on, besides the seed of rng4
+AIRPORT_KEYS = ["mapX", "mapY", "timeStep", "airportTrafficDensity", "minWindShift", "maxWindShift", "rwyLength",
+                "numAirports", "numRunways", "rwySpacing"]
+
+
+# everything that makes up one simulated world
+class World:
+
+    def __init__(self, config, simulation_manager, airspace, facilities, destinations, drone_fleet, facility_index, destination_store=None, demand_trace=None, closure_replay=None):
+        self.config = config
+        self.simulationManager = simulation_manager
+        self.airspace = airspace
+        self.airport = airspace.airportTraffic[0].airport  # first runway, for single runway scenarios
+        self.airportTraffic = airspace.airportTraffic[0]
+        self.facilities = facilities
+        self.destinations = destinations  # list of Destination, or the DestinationStore
+        self.destinationStore = destination_store
+        self.demandTrace = demand_trace  # TraceDemand replaying the orders of a trace, if there are no destinations
+        self.droneFleet = drone_fleet
+        self.closureReplay = closure_replay  # ClosureReplay setting the closure state of the airports, if they are not simulated
+        self.facilityIndex = facility_index  # for finding the facilities closest to a point
+
+
+# seeds of rng1 to rng4. Replication None uses the configured seeds as they are, every replication index gets its own
+# independent streams spawned from them
+def replication_seeds(config, replication=None):
+    if replication is None:
+        return list(config["seeds"])
+    streams = np.random.SeedSequence(config["seeds"], spawn_key=(replication,)).spawn(4)
+    return [int(stream.generate_state(1)[0]) for stream in streams]
+
+
+# request and unloading streams of catchment i, spawned from the seeds of rng2 and rng3
+def catchment_streams(seeds, i):
+    return (RandomStream(np.random.SeedSequence(seeds[1], spawn_key=(i,))),
+            RandomStream(np.random.SeedSequence(seeds[2], spawn_key=(i,))))
+
+
+# initialize airports and their traffic from rng4. Every runway is an Airport of its own. The runways of an airport share
+# the wind seed, so they always change ops direction together
+def build_airports(config, rng4, sim):
+    airportTraffic = []
+    for i in range(0, config["numAirports"]):
+        x1 = rng4.integers(0, config["mapX"])
+        y1 = rng4.integers(0, config["mapY"])
+        rwyHdg = rng4.integers(0, 359) * (math.pi / 180)  # cartesian direction in rad, not cardinal direction
+        rwyLength = config["rwyLength"]
+        windSeed = rng4.integers(0, 1000000)
+        for j in range(0, config["numRunways"]):
+            # parallel runways are offset to the left of the first one
+            offsetX = -math.sin(rwyHdg) * config["rwySpacing"] * j
+            offsetY = math.cos(rwyHdg) * config["rwySpacing"] * j
+            x2 = rwyLength * math.cos(rwyHdg) + x1 + offsetX
+            y2 = rwyLength * math.sin(rwyHdg) + y1 + offsetY
+            airport = Airport(x1 + offsetX, y1 + offsetY, x2, y2, rwyLength, windSeed, config["minWindShift"], config["maxWindShift"], sim)
+            airportTraffic.append(AirportTraffic(config["airportTrafficDensity"], rng4.integers(0, 100000), sim, airport))
+    return airportTraffic
+
+
+# closure timeline of the airports built from seed up to maxTime. Timelines are cached by seed and AIRPORT_KEYS, so
+# every run, replication and sweep point with the same airports simulates them only once. A cached timeline is reused
+# for shorter runs too
+def closure_timeline(config, seed):
+    path = None
+    if config["closureTimelineCache"] is not None:
+        text = json.dumps({"airports": {key: config[key] for key in AIRPORT_KEYS}, "seed": seed}, sort_keys=True)
+        path = os.path.join(config["closureTimelineCache"], hashlib.sha256(text.encode()).hexdigest() + ".npz")
+        if os.path.exists(path):
+            timeline = load_closure_timeline(path)
+            if timeline.endTime + config["timeStep"] > config["maxTime"]:
+                return timeline
+
+    sim = SimulationManager(config["maxTime"], config["timeStep"], False)
+    timeline = record_closure_timeline(build_airports(config, RandomStream(seed), sim), sim, config["maxTime"])
+    if path is not None:
+        os.makedirs(config["closureTimelineCache"], exist_ok=True)
+        timeline.save(path)
+    return timeline
+
+
+# catchments are the indices of the facilities whose drones, employees and destinations are built, None for all of
+# them. The other facilities are still placed, as destinations are connected to the closest facility, but stay empty.
+# Catchments can only be built apart with catchmentStreams, see parallel.py
+def build_world(config, replication=None, catchments=None):
+    if catchments is not None and not config["catchmentStreams"]:
+        raise ValueError("catchments can only be built apart with catchmentStreams")
+    seeds = replication_seeds(config, replication)
+    rng1 = RandomStream(seeds[0])  # positions of the facilities and destinations
+    rng2 = RandomStream(seeds[1])  # times between requests, shared by all destinations
+    rng3 = RandomStream(seeds[2])  # unloading times, shared by all customers
+    rng4 = RandomStream(seeds[3])  # airport RNG
+
+    mapX = config["mapX"]
+    mapY = config["mapY"]
+    sim = SimulationManager(config["maxTime"], config["timeStep"], config["eventDriven"])
+
+    airportTraffic = build_airports(config, rng4, sim)
+    airspace = Airspace(sim, airportTraffic)
+    droneFleet = DroneFleet(sim, airspace) if config["vectorizedDrones"] else None
+
+    # initialize facilities
+    facilities = []
+    for i in range(0, config["numFacilities"]):
+        employees = []
+        drones = []
+        if catchments is None or i in catchments:
+            for j in range(0, config["numEmployeesPerFacility"]):
+                employees.append(Employee(sim))
+            for j in range(0, config["numDronesPerFacility"]):
+                drones.append(droneFleet.add_drone(config["droneSpeed"]) if droneFleet is not None else Drone(sim, config["droneSpeed"], airspace))
+
+        xPos = rng1.integers(0, mapX)
+        yPos = rng1.integers(0, mapY)
+
+        fac = SendingFacility(employees, drones, xPos, yPos, sim)
+        facilities.append(fac)
+
+        # set drone facility
+        for drone in drones:
+            drone.set_base(fac)
+
+    # request stream and shared customer of the catchment of every built facility. Without catchmentStreams all
+    # catchments share rng2 and rng3
+    requestStreams = {}
+    customers = {}
+    for i, fac in enumerate(facilities):
+        if catchments is None or i in catchments:
+            requestStreams[fac], unloadingStream = catchment_streams(seeds, i) if config["catchmentStreams"] else (rng2, rng3)
+            customers[fac] = Customer(sim, unloadingStream)
+
+    # initialize destinations, each connected to the closest facility
+    facilityIndex = FacilityIndex(facilities)
+    demandTrace = None
+    destinationStore = None
+    destinations = []
+    if config["demandTrace"] is not None:
+        demandTrace = TraceDemand(sim, config["demandTrace"], facilityIndex, customers)
+    elif config["compactDestinations"]:
+        destinationStore = DestinationStore(sim, config["minRequestTime"], config["maxRequestTime"])
+        for fac in customers:
+            destinationStore.add_catchment(fac, requestStreams[fac], customers[fac])
+        destinations = destinationStore
+    for i in range(0, config["numDestination"] if demandTrace is None else 0):
+        xPos = rng1.integers(0, mapX)
+        yPos = rng1.integers(0, mapY)
+        closestFacility = facilityIndex.nearest(xPos, yPos)[0]
+        if closestFacility not in customers:
+            continue
+
+        if destinationStore is not None:
+            destinationStore.add_destination(xPos, yPos, closestFacility)
+            continue
+
+        # initialize customer at the destinations
+        customer = Customer(sim, customers[closestFacility].rng)
+
+        destinations.append(Destination(config["minRequestTime"], config["maxRequestTime"], xPos, yPos, requestStreams[closestFacility], closestFacility, customer))
+
+    # built last, so the other agents keep the same order as when the airports are simulated
+    closureReplay = None
+    if config["closureTimeline"]:
+        closureReplay = ClosureReplay(sim, closure_timeline(config, seeds[3]), airportTraffic)
+
+    return World(config, sim, airspace, facilities, destinations, droneFleet, facilityIndex, destinationStore, demandTrace, closureReplay)
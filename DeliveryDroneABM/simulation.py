@@ -0,0 +1,300 @@
+import gzip
+import pickle
+
+import numpy as np
+
+from aircraft import Drone
+from deliveryLog import DeliveryLog
+from metrics import MetricsRecorder
+from profiler import SubsystemProfiler
+from scenario import DEFAULT_CONFIG, build_world
+from simulationManager import SimulationManager
+
+# format of the files written by Simulation.save_checkpoint()
+CHECKPOINT_VERSION = 1
+
+# quantities logged every loggingRate seconds
+LOG_KEYS = ["idlingDrones", "loadingDrones", "deliveringDrones", "unloadingDrones", "returningDrones", "activeDrones",
+            "activeRequests", "pendingRequests", "freeEmployees", "time"]
+
+
+# a built world that can be advanced step by step, built on the clock of its SimulationManager. Nothing is plotted and
+# matplotlib is not imported unless plot() or animate() is called
+class Simulation:
+
+    def __init__(self, config=None, replication=None, catchments=None):
+        self.config = None
+        self.world = None
+        self.simulationManager = None
+        self.nextTick = 0  # first tick that has not been simulated yet
+        self.metrics = None
+        self.facilityLog = {}
+        if config is not None:
+            self.build(config, replication, catchments)
+
+    # parameters missing from config are taken from DEFAULT_CONFIG. catchments are the indices of the facilities to
+    # simulate, None for all of them, see build_world()
+    def build(self, config, replication=None, catchments=None):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.world = build_world(self.config, replication, catchments)
+        self.simulationManager = self.world.simulationManager
+        self.nextTick = 0
+        self.metrics = MetricsRecorder(self.config["maxTime"], self.config["loggingRate"])
+        for key in LOG_KEYS:
+            self.metrics.add_column(key, np.float64 if key == "time" else np.int64)
+        self.facilityLog = {}
+
+        sim = self.simulationManager
+        if sim.eventDriven:
+            # initial events, everything else is scheduled by the agents themselves
+            sim.schedule_tick(0, SimulationManager.FACILITY_LOGGING, 0, self.log_facilities)
+            if self.world.demandTrace is not None:
+                self.world.demandTrace.schedule_requests()
+            elif self.world.destinationStore is not None:
+                self.world.destinationStore.schedule_requests()
+            else:
+                for dest in self.world.destinations:
+                    dest.schedule_request()
+            if self.world.closureReplay is not None:
+                self.world.closureReplay.schedule_update()
+            else:
+                for airportTraffic in self.world.airspace.airportTraffic:
+                    airportTraffic.airport.schedule_wind_change()
+                    airportTraffic.schedule_update(0)
+        return self
+
+    # simulate the next n ticks
+    def step(self, n=1):
+        self.run_until(self.simulationManager.ticks_after(self.nextTick, n - 1))
+
+    # simulate every tick up to and including time t
+    def run_until(self, t):
+        sim = self.simulationManager
+        if sim.eventDriven:
+            sim.run_events(t)
+            self.nextTick = max(self.nextTick, sim.tick_after(t))
+        else:
+            while sim.currentTime <= t:
+                self.tick()
+            self.nextTick = sim.currentTime
+
+    # simulate until maxTime and return the results
+    def run(self):
+        self.run_until(self.config["maxTime"])
+        if self.simulationManager.deliveryLog is not None:
+            self.simulationManager.deliveryLog.flush()
+        return self.results()
+
+    # logged columns by name
+    def results(self):
+        return self.metrics.as_dict()
+
+    # counter is called with the world at every logging time, see MetricsRecorder.add_counter()
+    def add_counter(self, name, counter, dtype=np.int64):
+        self.metrics.add_counter(name, counter, dtype)
+
+    # stream a record of every delivery finished from now on to path, see deliveryLog.py. Close the returned log when
+    # done with it
+    def log_deliveries(self, path, chunk_size=4096):
+        self.simulationManager.deliveryLog = DeliveryLog(self.simulationManager, path, chunk_size)
+        return self.simulationManager.deliveryLog
+
+    # time every tick or event by subsystem from now on, see profiler.py. window is the simulated seconds per window of
+    # the breakdown by window, and cProfile runs between the (start, end) simulated times of profile_windows
+    def profile(self, window=None, profile_windows=()):
+        self.simulationManager.profiler = SubsystemProfiler(window, profile_windows)
+        return self.simulationManager.profiler
+
+    # stop timing, returns the profiler with the timings
+    def stop_profiling(self):
+        profiler = self.simulationManager.profiler
+        self.simulationManager.profiler = None
+        return profiler
+
+    # .npz, or .parquet if pyarrow is installed
+    def save_results(self, path):
+        self.metrics.save(path)
+
+    # the whole simulation state, world, clock, pending events, RNG streams and logged data, as a gzip compressed pickle.
+    # Counters added with add_counter() have to be picklable
+    def save_checkpoint(self, path):
+        with gzip.open(path, "wb") as file:
+            pickle.dump({"version": CHECKPOINT_VERSION, "simulation": self}, file, pickle.HIGHEST_PROTOCOL)
+
+    # independent copy of the simulation in its current state, for branching off what-if scenarios. If deliveries are
+    # logged, the copy logs the deliveries it finishes to delivery_log_path
+    def fork(self, delivery_log_path=None):
+        simulation = pickle.loads(pickle.dumps(self, pickle.HIGHEST_PROTOCOL))
+        simulation.open_delivery_log(delivery_log_path)
+        return simulation
+
+    # a restored DeliveryLog writes nowhere, this opens it on path. Nothing is done if path is None or deliveries are
+    # not logged
+    def open_delivery_log(self, path):
+        if path is not None and self.simulationManager.deliveryLog is not None:
+            self.simulationManager.deliveryLog.open(path)
+
+    # a new idling drone at facility, e.g. for a what-if branch
+    def add_drone(self, facility):
+        droneFleet = self.world.droneFleet
+        if droneFleet is not None:
+            drone = droneFleet.add_drone(self.config["droneSpeed"])
+        else:
+            drone = Drone(self.simulationManager, self.config["droneSpeed"], self.world.airspace)
+        facility.add_drone(drone)
+        return drone
+
+    # one tick of the fixed time step loop. The subsystems are updated in the order of the event phases
+    def tick(self):
+        sim = self.simulationManager
+        updates = ((SimulationManager.FACILITY, self.update_facilities), (SimulationManager.FACILITY_LOGGING, self.tick_log_facilities),
+                   (SimulationManager.DRONE, self.update_drones), (SimulationManager.DRONE_LOGGING, self.tick_log_drones),
+                   (SimulationManager.DESTINATION, self.update_destinations), (SimulationManager.AIRPORT, self.update_airports),
+                   (SimulationManager.TRAFFIC, self.update_traffic))
+        if sim.profiler is None:
+            for phase, update in updates:
+                update()
+        else:
+            sim.profiler.set_time(sim.currentTime)
+            for phase, update in updates:
+                sim.profiler.call(SimulationManager.PHASE_NAMES[phase], update)
+
+        # update simulation time
+        sim.set_tick(sim.currentTick + 1)
+
+    # facilities only interact with their own drones, so they can all be updated before the drones
+    def update_facilities(self):
+        for facility in self.world.facilities:
+            facility.update()
+
+    def update_drones(self):
+        if self.world.droneFleet is not None:
+            self.world.droneFleet.update()
+        else:
+            for facility in self.world.facilities:
+                for drone in facility.drones:
+                    drone.update()
+
+    def update_destinations(self):
+        if self.world.demandTrace is not None:
+            self.world.demandTrace.update()
+        elif self.world.destinationStore is not None:
+            self.world.destinationStore.update()
+        else:
+            for dest in self.world.destinations:
+                dest.request_update(self.simulationManager.currentTime)
+
+    # replayed airports change in update_traffic() only
+    def update_airports(self):
+        if self.world.closureReplay is not None:
+            return
+        for airportTraffic in self.world.airspace.airportTraffic:
+            airportTraffic.airport.update()
+
+    def update_traffic(self):
+        if self.world.closureReplay is not None:
+            self.world.closureReplay.update()
+            return
+        for airportTraffic in self.world.airspace.airportTraffic:
+            airportTraffic.update()
+
+    # number of ticks between two logged data points
+    def logging_ticks(self):
+        return max(self.simulationManager.tick_index(self.config["loggingRate"]), 1)
+
+    def tick_log_facilities(self):
+        if self.simulationManager.currentTick % self.logging_ticks() == 0:
+            self.log_facilities()
+
+    def tick_log_drones(self):
+        if self.simulationManager.currentTick % self.logging_ticks() == 0:
+            self.log_drones()
+
+    # the counters of the simulation manager are read in between facility and drone updates, as drones finishing a
+    # task change the number of requests and free employees. Under the event driven clock, these are two events on
+    # the same tick
+    def log_facilities(self):
+        sim = self.simulationManager
+        self.facilityLog["active"] = sim.activeRequests
+        self.facilityLog["pending"] = sim.pendingRequests
+        self.facilityLog["freeEmployees"] = sim.freeEmployees
+        if sim.eventDriven:
+            sim.schedule_tick(sim.currentTick, SimulationManager.DRONE_LOGGING, 0, self.log_drones)
+
+    def log_drones(self):
+        sim = self.simulationManager
+        counts = sim.droneStatusCounts
+        self.metrics.record(self.world, idlingDrones=counts["idling"], loadingDrones=counts["loading"],
+                            deliveringDrones=counts["delivering"], unloadingDrones=counts["unloading"],
+                            returningDrones=counts["returning"],
+                            activeDrones=counts["loading"] + counts["delivering"] + counts["unloading"] + counts["returning"],
+                            activeRequests=self.facilityLog["active"], pendingRequests=self.facilityLog["pending"],
+                            freeEmployees=self.facilityLog["freeEmployees"], time=sim.currentTime)
+        if sim.eventDriven:
+            sim.schedule_tick(sim.currentTick + self.logging_ticks(), SimulationManager.FACILITY_LOGGING, 0, self.log_facilities)
+
+    def plot(self, show=True):
+        from matplotlib import pylab as plt
+
+        results = self.results()
+        time = results["time"]
+
+        plt.figure(0)
+        plt.plot(time, results["idlingDrones"])
+        plt.plot(time, results["loadingDrones"])
+        plt.plot(time, results["deliveringDrones"])
+        plt.plot(time, results["unloadingDrones"])
+        plt.plot(time, results["returningDrones"])
+        plt.legend(["Idling", "Loading", "Delivering", "Unloading", "Returning"])
+        plt.xlabel("Time (s)")
+        plt.ylabel("Number of Drones")
+        plt.title("Drone Status Plot")
+
+        plt.figure(1)
+        plt.plot(time, results["idlingDrones"])
+        plt.plot(time, results["activeDrones"])
+        plt.legend(["Idling", "Active"])
+        plt.xlabel("Time (s)")
+        plt.ylabel("Number of Drones")
+        plt.title("Drone Status Plot")
+
+        plt.figure(2)
+        plt.plot(time, results["activeRequests"])
+        plt.plot(time, results["pendingRequests"])
+        plt.legend(["Active", "Pending"])
+        plt.xlabel("Time (s)")
+        plt.ylabel("Number of Requests")
+        plt.title("Request Plot")
+
+        plt.figure(3)
+        plt.plot(time, results["freeEmployees"])
+        plt.xlabel("Time (s)")
+        plt.ylabel("Number of Free Employees")
+        plt.title("Employee Plot")
+        if show:
+            plt.show()
+
+    # window that follows the simulation from where it is to maxTime, see renderer.py. frame_time simulated seconds
+    # pass between frames
+    def animate(self, interval=100, frame_time=None):
+        from renderer import Renderer
+
+        return Renderer(self, frame_time).show(interval=interval)
+
+    # render the simulation from where it is to maxTime to a .gif or .mp4 file without opening a window
+    def record(self, path, frame_time=None, fps=30):
+        from renderer import Renderer
+
+        Renderer(self, frame_time).save(path, fps=fps)
+
+
+# simulation saved by Simulation.save_checkpoint(), ready to continue from where it was saved. If deliveries are logged,
+# the restored simulation logs the deliveries it finishes to delivery_log_path
+def load_checkpoint(path, delivery_log_path=None):
+    with gzip.open(path, "rb") as file:
+        checkpoint = pickle.load(file)
+    if checkpoint["version"] != CHECKPOINT_VERSION:
+        raise ValueError("unsupported checkpoint version " + str(checkpoint["version"]))
+    simulation = checkpoint["simulation"]
+    simulation.open_delivery_log(delivery_log_path)
+    return simulation
@@ -1,10 +1,140 @@
+import heapq
+import math
+
+import numpy as np
+
+
+# every status a drone can have
+DRONE_STATUSES = ["idling", "loading", "delivering", "unloading", "returning"]
+
+
 class SimulationManager:
 
-    def __init__(self, max_time, time_step):
+    # event phases. Events at the same time are processed in the same order the fixed time step loop updates the
+    # model within one tick, so the event driven clock gives the same results as the fixed time step loop
+    FACILITY = 0
+    FACILITY_LOGGING = 1
+    DRONE = 2
+    DRONE_LOGGING = 3
+    DESTINATION = 4
+    AIRPORT = 5
+    TRAFFIC = 6
+    PHASE_NAMES = ["facilities", "logging", "drones", "logging", "destinations", "airport", "traffic"]  # subsystem of each phase
+
+    def __init__(self, max_time, time_step, event_driven=False):
         self.loadingTime = 60  # loading time per package
         self.maxUnloadingTime = 360  # maximum unloading time per package, simulating client not paying attention or is new drone delivery system
         self.minUnloadingTime = 60  # minimum unloading time per package
 
         self.maxTime = max_time, time_step
         self.timeStep = time_step
-        self.currentTime = 0
\ No newline at end of file
+        self.currentTick = 0  # the clock counts whole ticks, so it does not drift for time steps that are not exact in binary
+        self.currentTime = 0  # currentTick * timeStep
+
+        self.closureIntervals = True  # drones look up precomputed closure intervals along their leg instead of testing the closure rectangles every tick
+        self.analyticLegs = True  # flying drones are only flown on the ticks they can enter a closure or arrive, see Drone.next_flight_time()
+        self.eventDriven = event_driven  # if the agents schedule their own updates instead of being updated every tick
+        self.eventQueue = []  # priority queue of (tick, phase, order, sequence, callback)
+        self.eventCounter = 0  # tie breaker so events scheduled first are processed first
+        self.agentCounter = 0  # update order of the agents within a phase
+
+        # counters kept up to date by the agents on every change, so logging does not have to walk the whole world
+        self.droneStatusCounts = {status: 0 for status in DRONE_STATUSES}  # number of drones with each status
+        self.freeEmployees = 0  # number of employees not loading a drone
+        self.pendingRequests = 0  # number of requests waiting for a drone
+        self.activeRequests = 0  # number of requests being delivered
+        self.deliveryLog = None  # DeliveryLog getting the status changes of the drones, if finished deliveries are logged
+        self.profiler = None  # SubsystemProfiler timing every tick or event by subsystem, if the run is profiled
+
+    # old_status is None for a new drone
+    def change_drone_status(self, old_status, new_status):
+        if old_status is not None:
+            self.droneStatusCounts[old_status] -= 1
+        self.droneStatusCounts[new_status] += 1
+
+    def next_agent_order(self):
+        self.agentCounter += 1
+        return self.agentCounter - 1
+
+    # move the clock to the given tick. Every tick time is tick * timeStep, so times of the same tick are always equal
+    def set_tick(self, tick):
+        self.currentTick = tick
+        self.currentTime = tick * self.timeStep
+
+    # index of the tick at time t, which has to be a tick time
+    def tick_index(self, t):
+        return round(t / self.timeStep)
+
+    # the tick searches below give the same tick as comparing t with the tick times tick * timeStep, the way the
+    # agents compare times with currentTime. t / timeStep is off by one at most when the time step is not exact in
+    # binary, e.g. 512.4 / 0.1 < 5124 even though 5124 * 0.1 == 512.4
+
+    # index of the first tick at or after time t
+    def tick_index_at_or_after(self, t):
+        tick = math.ceil(t / self.timeStep)
+        if (tick - 1) * self.timeStep >= t:
+            return tick - 1
+        if tick * self.timeStep < t:
+            return tick + 1
+        return tick
+
+    # index of the last tick at or before time t
+    def tick_index_at_or_before(self, t):
+        tick = math.floor(t / self.timeStep)
+        if (tick + 1) * self.timeStep <= t:
+            return tick + 1
+        if tick * self.timeStep > t:
+            return tick - 1
+        return tick
+
+    # first tick at or after time t
+    def tick_at_or_after(self, t):
+        return self.tick_index_at_or_after(t) * self.timeStep
+
+    # first tick strictly after time t
+    def tick_after(self, t):
+        return (self.tick_index_at_or_before(t) + 1) * self.timeStep
+
+    # tick_after() of every time in the array t
+    def ticks_after_times(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        tick = np.floor(t / self.timeStep)
+        tick = np.where((tick + 1) * self.timeStep <= t, tick + 1, tick)
+        tick = np.where(tick * self.timeStep > t, tick - 1, tick)
+        return (tick + 1) * self.timeStep
+
+    # the tick n ticks after tick t
+    def ticks_after(self, t, n):
+        return (self.tick_index(t) + n) * self.timeStep
+
+    # callback is called without arguments once the clock reaches time, which has to be a tick time
+    def schedule(self, time, phase, order, callback):
+        self.schedule_tick(self.tick_index(time), phase, order, callback)
+
+    # callback is called without arguments once the clock reaches the tick with index tick
+    def schedule_tick(self, tick, phase, order, callback):
+        heapq.heappush(self.eventQueue, (tick, phase, order, self.eventCounter, callback))
+        self.eventCounter += 1
+
+    def next_event_time(self):
+        return self.eventQueue[0][0] * self.timeStep if self.eventQueue else math.inf
+
+    # process all events up to and including end_time, jumping the clock from one event to the next
+    def run_events(self, end_time):
+        if self.profiler is not None:
+            self.run_events_profiled(end_time)
+            return
+        end_tick = self.tick_index_at_or_before(end_time)
+        while self.eventQueue and self.eventQueue[0][0] <= end_tick:
+            tick, phase, order, sequence, callback = heapq.heappop(self.eventQueue)
+            self.set_tick(tick)
+            callback()
+
+    # same as run_events(), charging every event to the subsystem of its phase
+    def run_events_profiled(self, end_time):
+        end_tick = self.tick_index_at_or_before(end_time)
+        while self.eventQueue and self.eventQueue[0][0] <= end_tick:
+            tick, phase, order, sequence, callback = heapq.heappop(self.eventQueue)
+            self.set_tick(tick)
+            self.profiler.set_time(self.currentTime)
+            self.profiler.call(self.PHASE_NAMES[phase], callback)
@@ -0,0 +1,94 @@
+import math
+
+# smallest default cell size in m. Facilities at or near the same spot would otherwise give cells far smaller than the
+# distances queried
+MIN_CELL_SIZE = 100.0
+
+
+# uniform grid over the positions of the sending facilities, for nearest facility and radius queries. Facilities do not
+# move, so the grid is built once
+class FacilityIndex:
+
+    def __init__(self, facilities, cell_size=None):
+        self.facilities = list(facilities)
+        xs = [facility.x for facility in self.facilities]
+        ys = [facility.y for facility in self.facilities]
+        self.minX = min(xs)
+        self.minY = min(ys)
+        width = max(xs) - self.minX
+        height = max(ys) - self.minY
+
+        # about one facility per cell by default
+        if cell_size is None:
+            cell_size = max(math.sqrt(width * height / len(self.facilities)), width / len(self.facilities), height / len(self.facilities), MIN_CELL_SIZE)
+        self.cellSize = cell_size
+
+        self.cells = {}  # (i, j) -> indices of the facilities in that cell
+        for index, facility in enumerate(self.facilities):
+            self.cells.setdefault(self.cell(facility.x, facility.y), []).append(index)
+        self.maxCellI = max(i for i, j in self.cells)
+        self.maxCellJ = max(j for i, j in self.cells)
+
+    def cell(self, x, y):
+        return int((x - self.minX) // self.cellSize), int((y - self.minY) // self.cellSize)
+
+    # cells whose largest index offset from (ci, cj) is exactly ring
+    def ring_cells(self, ci, cj, ring):
+        if ring == 0:
+            yield ci, cj
+            return
+        for i in range(ci - ring, ci + ring + 1):
+            yield i, cj - ring
+            yield i, cj + ring
+        for j in range(cj - ring + 1, cj + ring):
+            yield ci - ring, j
+            yield ci + ring, j
+
+    # the k closest facilities to (x, y) for which accept(facility) is true, closest first. Facilities at the same
+    # distance are in the order they were given in. accept can e.g. skip saturated facilities when reassigning
+    def nearest(self, x, y, k=1, accept=None):
+        ci, cj = self.cell(x, y)
+        last_ring = max(abs(ci), abs(cj), abs(self.maxCellI - ci), abs(self.maxCellJ - cj))
+        found = []  # (squared distance, index)
+        for ring in range(0, last_ring + 1):
+            # once a ring has more cells than there are occupied cells, e.g. far away from the facilities, the occupied
+            # cells from this ring on are looked at directly instead
+            if 8 * ring > len(self.cells):
+                cells = [(i, j) for i, j in self.cells if max(abs(i - ci), abs(j - cj)) >= ring]
+            else:
+                cells = self.ring_cells(ci, cj, ring)
+            for cell in cells:
+                for index in self.cells.get(cell, ()):
+                    facility = self.facilities[index]
+                    if accept is None or accept(facility):
+                        found.append(((x - facility.x)**2 + (y - facility.y)**2, index))
+
+            if 8 * ring > len(self.cells):
+                break
+            # every cell further out is at least ring cells away from (x, y)
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= (ring * self.cellSize)**2:
+                    break
+
+        found.sort()
+        return [self.facilities[index] for dist_sq, index in found[:k]]
+
+    # facilities within radius of (x, y), closest first
+    def within(self, x, y, radius):
+        i_min, j_min = self.cell(x - radius, y - radius)
+        i_max, j_max = self.cell(x + radius, y + radius)
+        if (i_max - i_min + 1) * (j_max - j_min + 1) < len(self.cells):
+            cells = [(i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)]
+        else:
+            cells = [(i, j) for i, j in self.cells if i_min <= i <= i_max and j_min <= j <= j_max]
+
+        found = []
+        for cell in cells:
+            for index in self.cells.get(cell, ()):
+                facility = self.facilities[index]
+                dist_sq = (x - facility.x)**2 + (y - facility.y)**2
+                if dist_sq <= radius**2:
+                    found.append((dist_sq, index))
+        found.sort()
+        return [self.facilities[index] for dist_sq, index in found]
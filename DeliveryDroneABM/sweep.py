@@ -0,0 +1,88 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from replications import SUMMARY_KEYS, confidence_interval, run_replication
+from scenario import DEFAULT_CONFIG, ENGINE_KEYS, replication_seeds
+
+
+# every combination of the given levels, e.g. {"numDronesPerFacility": [4, 8], "droneSpeed": [20, 30]} gives 4 points
+def grid_design(levels):
+    names = list(levels)
+    return [dict(zip(names, values)) for values in itertools.product(*(levels[name] for name in names))]
+
+
+# num_points points spread over the given (low, high) ranges, with exactly one point in each of num_points equal
+# slices of every range. Parameters with integer bounds get integer values from low to high, drawn from slices of
+# whole values so no two points share a value. With more points than values, every value is shared by about the
+# same number of points
+def latin_hypercube_design(ranges, num_points, seed=0):
+    rng = np.random.default_rng(seed)
+    design = [{} for i in range(0, num_points)]
+    for name, (low, high) in ranges.items():
+        slices = rng.permutation(num_points)
+        if isinstance(low, int) and isinstance(high, int):
+            num_values = high - low + 1
+            starts = slices * num_values // num_points
+            ends = np.maximum((slices + 1) * num_values // num_points, starts + 1)
+            values = [low + int(value) for value in rng.integers(starts, ends)]
+        else:
+            values = [float(low + fraction * (high - low)) for fraction in (slices + rng.random(num_points)) / num_points]
+        for point, value in zip(design, values):
+            point[name] = value
+    return design
+
+
+# cache key of one replication of one configuration, changes if any parameter or seed changes. Engine settings give the
+# same results, so they are left out and switching engines reuses the cached results
+def point_key(config, replication):
+    parameters = {key: value for key, value in config.items() if key not in ENGINE_KEYS}
+    text = json.dumps({"config": parameters, "seeds": replication_seeds(config, replication)}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# run num_replications replications of every point of the design, each point being changes to base_config. Summaries
+# are cached in cache_dir as they finish, so re-running a sweep only runs the points and replications not done before.
+# Returns one entry per design point with its summaries and their confidence intervals
+def run_sweep(design, base_config=DEFAULT_CONFIG, num_replications=1, cache_dir="sweepCache", max_workers=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    summaries = [[None] * num_replications for point in design]
+
+    jobs = []
+    for i, point in enumerate(design):
+        config = dict(base_config, **point)
+        for replication in range(0, num_replications):
+            path = os.path.join(cache_dir, point_key(config, replication) + ".json")
+            if os.path.exists(path):
+                with open(path) as file:
+                    summaries[i][replication] = json.load(file)["summary"]
+            else:
+                jobs.append((i, replication, config, path))
+
+    if len(jobs) != 0:
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = {executor.submit(run_replication, config, replication): (i, replication, config, path) for i, replication, config, path in jobs}
+            for future in as_completed(futures):
+                i, replication, config, path = futures[future]
+                summaries[i][replication] = future.result()
+
+                # write to a temporary file first, so an interrupted sweep never leaves a broken cache entry
+                with open(path + ".tmp", "w") as file:
+                    json.dump({"config": config, "replication": replication, "summary": summaries[i][replication]}, file)
+                os.replace(path + ".tmp", path)
+
+    results = []
+    for point, point_summaries in zip(design, summaries):
+        intervals = {key: confidence_interval([summary[key] for summary in point_summaries]) for key in SUMMARY_KEYS}
+        results.append({"point": point, "summaries": point_summaries, "intervals": intervals})
+    return results
+
+
+if __name__ == "__main__":
+    design = grid_design({"numDronesPerFacility": [4, 8, 16], "numEmployeesPerFacility": [1, 2, 4]})
+    for result in run_sweep(design, num_replications=4):
+        print(str(result["point"]) + ": " + ", ".join(key + " " + str(round(result["intervals"][key][0], 3)) for key in SUMMARY_KEYS))
@@ -0,0 +1,116 @@
+import os
+import tempfile
+
+import numpy as np
+
+from demandTrace import write_trace
+from parallel import run_parallel
+from simulation import Simulation
+
+# the clocks, drone and destination engines and closure lookups are all meant to give exactly the same logs. A short
+# scenario with several facilities and parallel runways, dense enough that drones are held outside closures. Run with
+# python -m pytest test_modes.py, or python test_modes.py
+CONFIG = {
+    "numAirports": 2,
+    "numRunways": 2,
+    "numFacilities": 4,
+    "numDestination": 120,
+    "airportTrafficDensity": 60,
+    "maxTime": 8000,
+    "closureTimelineCache": None,
+}
+
+# (name, config changes, closureIntervals, analyticLegs) of every mode compared to the plain event driven run
+MODES = [
+    ("tick", {"eventDriven": False}, True, True),
+    ("tick, per tick flight", {"eventDriven": False}, True, False),
+    ("rectangle test", {}, False, True),
+    ("tick, rectangle test", {"eventDriven": False}, False, False),
+    ("fleet", {"vectorizedDrones": True}, True, True),
+    ("tick, fleet", {"eventDriven": False, "vectorizedDrones": True}, True, True),
+    ("fleet, rectangle test", {"vectorizedDrones": True}, False, True),
+    ("compact destinations", {"compactDestinations": True}, True, True),
+    ("tick, compact destinations", {"eventDriven": False, "compactDestinations": True}, True, True),
+    ("closure timeline", {"closureTimeline": True}, True, True),
+    ("tick, fleet, closure timeline", {"eventDriven": False, "vectorizedDrones": True, "closureTimeline": True}, True, True),
+]
+
+
+def build(changes=None, closure_intervals=True, analytic_legs=True):
+    simulation = Simulation(dict(CONFIG, **(changes or {})))
+    simulation.simulationManager.closureIntervals = closure_intervals
+    simulation.simulationManager.analyticLegs = analytic_legs
+    return simulation
+
+
+def differences(expected, results):
+    return [key for key in expected if not np.array_equal(expected[key], results[key])]
+
+
+def test_scenario_holds_drones():
+    simulation = build()
+    simulation.run()
+    assert sum(drone.frozenTime for facility in simulation.world.facilities for drone in facility.drones) > 0
+
+
+# names of the modes whose logs differ from the plain event driven run, with the columns that differ
+def failed_modes(base_changes=None):
+    base_changes = base_changes or {}
+    expected = build(base_changes).run()
+    failed = []
+    for name, changes, closure_intervals, analytic_legs in MODES:
+        columns = differences(expected, build(dict(base_changes, **changes), closure_intervals, analytic_legs).run())
+        if columns:
+            failed.append(name + ": " + ", ".join(columns))
+    return failed
+
+
+def test_modes_give_the_same_logs():
+    failed = failed_modes()
+    assert not failed, "; ".join(failed)
+
+
+# every tick time and logging time is worked out from whole ticks
+def test_modes_give_the_same_logs_with_a_fractional_time_step():
+    failed = failed_modes({"timeStep": 0.1, "maxTime": 1000, "loggingRate": 50})
+    assert not failed, "; ".join(failed)
+
+
+# orders placed exactly at the facilities are flown out and back along legs of zero length
+def test_modes_give_the_same_logs_with_zero_length_legs():
+    facilities = build().world.facilities
+    x = np.array([facility.x for facility in facilities] * 3, dtype=np.float64)
+    y = np.array([facility.y for facility in facilities] * 3, dtype=np.float64)
+    time = np.arange(1, len(x) + 1) * 150.0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "orders.trace")
+        write_trace(path, time, x, y)
+        failed = failed_modes({"demandTrace": path, "maxTime": 3000})
+    assert not failed, "; ".join(failed)
+
+
+def test_fork_continues_the_same_run():
+    expected = build().run()
+    simulation = build()
+    simulation.run_until(CONFIG["maxTime"] / 2)
+    assert not differences(expected, simulation.fork().run())
+
+
+# 0.1 s is not exact in binary, so tick times worked out in floats are not exact multiples of it
+def test_fractional_time_step_finishes():
+    results = build({"timeStep": 0.1, "maxTime": 1500, "loggingRate": 100}).run()
+    assert np.array_equal(results["time"], np.arange(0, 1501, 100))
+
+
+def test_parallel_catchments_give_the_serial_logs():
+    expected = build({"catchmentStreams": True}).run()
+    assert not differences(expected, run_parallel(CONFIG, 2))
+
+
+if __name__ == "__main__":
+    for test in (test_scenario_holds_drones, test_modes_give_the_same_logs,
+                 test_modes_give_the_same_logs_with_a_fractional_time_step,
+                 test_modes_give_the_same_logs_with_zero_length_legs, test_fork_continues_the_same_run,
+                 test_fractional_time_step_finishes, test_parallel_catchments_give_the_serial_logs):
+        test()
+        print(test.__name__ + " passed")